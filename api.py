@@ -0,0 +1,290 @@
+# api.py
+# API HTTP/JSON headless di atas data yang sama dengan dashboard (tanpa render Streamlit).
+# Jalankan: uvicorn api:app --host 0.0.0.0 --port 8000
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+
+from bps_dataset import SharedDataset, RASIO_LP_COL, RASIO_PP_COL
+from bps_loader import BackgroundLoader, create_mongo_client
+from bps_schema import COLUMN_MAP, apply_schema, is_schema_report_current
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s")
+
+load_dotenv()
+MONGO_URI: Optional[str] = os.getenv("MONGO_URI")
+MONGO_DATABASE_NAME: str = os.getenv("MONGO_DATABASE_NAME", "bps_db")
+BPS_ID_TABEL_TARGET: str = "TE9UUDFUV3Bpa3ovMHJJVGtuUHZVdz09" # Sesuai scraper
+BPS_TAHUN_TARGET: str = "2024" # Sesuai scraper
+
+LOADER_WAIT_SECONDS: int = 15 # Batas tunggu muat pertama per tabel/tahun sebelum membalas 503
+MAX_LOADERS: int = 16 # Loader aktif (thread per tabel/tahun); yang paling lama tidak dipakai dihentikan saat penuh
+MAX_DATASETS: int = 8
+MAX_CACHED_RESPONSES: int = 256
+
+MEDIA_TYPES: Dict[str, str] = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+_lock = threading.Lock()
+_mongo_client: Optional[Any] = None # Satu MongoClient (pool koneksi) dibagi semua loader
+_loaders: "OrderedDict[Tuple[str, str], BackgroundLoader]" = OrderedDict()
+_datasets: "OrderedDict[str, SharedDataset]" = OrderedDict()
+_responses: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+
+
+def collection_name_for(id_tabel: str, tahun: str) -> str:
+    """Nama koleksi MongoDB untuk tabel/tahun, mengikuti konvensi penamaan scraper."""
+    default_name = f"data_bps_{id_tabel.replace('=', '').replace('/', '')}_{tahun}"
+    if id_tabel == BPS_ID_TABEL_TARGET and tahun == BPS_TAHUN_TARGET:
+        return os.getenv("MONGO_COLLECTION_NAME", default_name)
+    return default_name
+
+
+def get_mongo_client() -> Any:
+    """MongoClient bersama untuk semua loader (dibuat sekali, koneksi dibuka oleh query pertama)."""
+    global _mongo_client
+    with _lock:
+        if _mongo_client is None:
+            _mongo_client = create_mongo_client(MONGO_URI)
+        return _mongo_client
+
+
+def _evict_loader(key: Tuple[str, str], loader: BackgroundLoader) -> None:
+    """Menghentikan loader dan melepasnya dari registry (jika belum diganti loader lain)."""
+    loader.stop()
+    with _lock:
+        if _loaders.get(key) is loader:
+            del _loaders[key]
+
+
+def get_loader(id_tabel: str, tahun: str) -> Tuple[BackgroundLoader, Dict[str, Any]]:
+    """Loader latar belakang per tabel/tahun beserta snapshot state-nya.
+
+    Loader hanya dipertahankan jika muat pertamanya menemukan dokumen; tabel/tahun yang tidak ada
+    langsung dihentikan dan dilepas, sehingga parameter acak tidak menghabiskan slot atau thread.
+    Jika registry penuh, loader yang paling lama tidak dipakai dihentikan (LRU).
+    """
+    if not MONGO_URI:
+        raise HTTPException(status_code=503, detail="MONGO_URI tidak diatur.")
+    client = get_mongo_client()
+    key = (id_tabel, tahun)
+    evicted: List[BackgroundLoader] = []
+    with _lock:
+        loader = _loaders.get(key)
+        if loader is not None:
+            _loaders.move_to_end(key)
+        else:
+            loader = BackgroundLoader(MONGO_URI, MONGO_DATABASE_NAME, collection_name_for(id_tabel, tahun), id_tabel, tahun, client=client).start()
+            _loaders[key] = loader
+            while len(_loaders) > MAX_LOADERS:
+                evicted.append(_loaders.popitem(last=False)[1])
+    for old_loader in evicted:
+        old_loader.stop()
+
+    if not loader.wait_until_ready(timeout=LOADER_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Data sedang dimuat, coba lagi sebentar.", headers={"Retry-After": "5"})
+    state = loader.snapshot()
+    if not state["latest_doc"]:
+        _evict_loader(key, loader)
+        if "mongo" in state["errors"]:
+            raise HTTPException(status_code=503, detail="Gagal memuat data dari MongoDB, coba lagi nanti.", headers={"Retry-After": "5"})
+        raise HTTPException(status_code=404, detail=f"Tidak ada data untuk ID Tabel '{id_tabel}' Tahun '{tahun}'.")
+    return loader, state
+
+
+def get_dataset(id_tabel: str, tahun: str) -> Tuple[str, SharedDataset, Dict[str, Any]]:
+    """Mengembalikan (kunci snapshot, dataset, dokumen) untuk tabel/tahun; dataset dibangun sekali per snapshot."""
+    latest_doc = get_loader(id_tabel, tahun)[1]["latest_doc"]
+    dataset_key = f"{id_tabel}|{tahun}|{latest_doc.get('timestamp_scraped_utc')}"
+    with _lock:
+        dataset = _datasets.get(dataset_key)
+        if dataset is not None:
+            _datasets.move_to_end(dataset_key)
+            return dataset_key, dataset, latest_doc
+
+    typed_rows, validasi_skema = latest_doc.get("data_provinsi_typed"), latest_doc.get("validasi_skema")
+    if not isinstance(typed_rows, list) or not is_schema_report_current(validasi_skema):
+        typed_rows, _ = apply_schema(latest_doc.get("data_provinsi") or [], latest_doc.get("metadata_tabel_scraped"), COLUMN_MAP)
+    dataset = SharedDataset(typed_rows, COLUMN_MAP)
+    if len(dataset) == 0:
+        raise HTTPException(status_code=404, detail=f"Data provinsi kosong setelah pemrosesan untuk ID Tabel '{id_tabel}' Tahun '{tahun}'.")
+
+    with _lock:
+        _datasets[dataset_key] = dataset
+        while len(_datasets) > MAX_DATASETS:
+            _datasets.popitem(last=False)
+    return dataset_key, dataset, latest_doc
+
+
+def cached_response(request: Request, cache_key_parts: List[Any], build: Callable[[], Tuple[bytes, str]]) -> Response:
+    """Melayani respons dari cache memori dengan ETag; 304 jika If-None-Match cocok.
+
+    ETag dihitung dari identitas snapshot + parameter query, jadi 304 bisa dibalas tanpa membangun body.
+    """
+    etag = '"' + hashlib.sha256("\x1f".join(str(part) for part in cache_key_parts).encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    # If-None-Match memakai perbandingan lemah: W/"x" cocok dengan "x" (proxy gzip sering melemahkan ETag)
+    client_tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if etag in client_tags or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    with _lock:
+        cached = _responses.get(etag)
+        if cached is not None:
+            _responses.move_to_end(etag)
+    if cached is None:
+        cached = build()
+        with _lock:
+            _responses[etag] = cached
+            while len(_responses) > MAX_CACHED_RESPONSES:
+                _responses.popitem(last=False)
+    body, media_type = cached
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _split_param(values: Optional[List[str]]) -> List[str]:
+    """Mendukung parameter berulang (?p=a&p=b) maupun dipisah koma (?p=a,b)."""
+    return [item.strip() for value in (values or []) for item in value.split(",") if item.strip()]
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_table(table: pa.Table, output_format: str, meta: Dict[str, Any]) -> Tuple[bytes, str]:
+    if output_format == "arrow":
+        sink = io.BytesIO()
+        table = table.replace_schema_metadata({key: str(value) for key, value in meta.items()})
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), MEDIA_TYPES["arrow"]
+    if output_format == "csv":
+        return table.to_pandas().to_csv(index=False).encode("utf-8"), MEDIA_TYPES["csv"]
+    rows = [{key: _json_value(value) for key, value in row.items()} for row in table.to_pylist()]
+    payload = {"meta": {key: _json_value(value) for key, value in meta.items()}, "data": rows}
+    return _dumps(payload), MEDIA_TYPES["json"]
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _snapshot_meta(dataset_key: str, latest_doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "bps_id_tabel": latest_doc.get("bps_id_tabel"),
+        "bps_tahun_data_request": latest_doc.get("bps_tahun_data_request"),
+        "bps_tahun_data_actual": latest_doc.get("bps_tahun_data_actual"),
+        "timestamp_scraped_utc": latest_doc.get("timestamp_scraped_utc"),
+        "snapshot": dataset_key,
+    }
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Panaskan loader tabel/tahun default saat server start, tanpa menunggu request pertama
+    global _mongo_client
+    if MONGO_URI:
+        key = (BPS_ID_TABEL_TARGET, BPS_TAHUN_TARGET)
+        client = get_mongo_client()
+        with _lock:
+            if key not in _loaders:
+                _loaders[key] = BackgroundLoader(MONGO_URI, MONGO_DATABASE_NAME, collection_name_for(*key), *key, client=client).start()
+    else:
+        logging.error("MONGO_URI tidak diatur. Endpoint data akan membalas 503.")
+    yield
+    with _lock:
+        loaders, client = list(_loaders.values()), _mongo_client
+        _loaders.clear()
+        _mongo_client = None
+    for loader in loaders:
+        loader.stop()
+    if client is not None:
+        client.close()
+
+
+app = FastAPI(title="API Data Ketenagakerjaan Indonesia (BPS)", lifespan=lifespan)
+
+
+@app.get("/health")
+def health() -> Dict[str, Any]:
+    with _lock:
+        loaders = {f"{id_tabel}|{tahun}": loader.snapshot() for (id_tabel, tahun), loader in _loaders.items()}
+    return {
+        "status": "ok",
+        "loaders": {key: {"ready": state["ready"], "doc_loaded_at": _json_value(state["doc_loaded_at"]), "errors": state["errors"]}
+                    for key, state in loaders.items()},
+    }
+
+
+@app.get("/v1/data")
+def get_data(request: Request,
+             tabel: str = Query(BPS_ID_TABEL_TARGET, description="ID Tabel BPS"),
+             tahun: str = Query(BPS_TAHUN_TARGET, description="Tahun data yang di-request scraper"),
+             provinsi: Optional[List[str]] = Query(None, description="Filter nama provinsi (berulang atau dipisah koma, tidak peka huruf besar)"),
+             columns: Optional[List[str]] = Query(None, description="Kolom yang dikembalikan (berulang atau dipisah koma); 'Provinsi' selalu disertakan"),
+             output_format: str = Query("json", alias="format", pattern="^(json|csv|arrow)$")) -> Response:
+    """Data per provinsi: variabel COLUMN_MAP yang sudah diparse plus rasio turunan."""
+    dataset_key, dataset, latest_doc = get_dataset(tabel, tahun)
+    provinsi_filter = sorted({name.upper() for name in _split_param(provinsi)})
+    requested_columns = _split_param(columns)
+
+    unknown_columns = [col for col in requested_columns if col not in dataset.table.column_names]
+    if unknown_columns:
+        raise HTTPException(status_code=400, detail={"kolom_tidak_dikenal": unknown_columns, "kolom_tersedia": dataset.table.column_names})
+    default_columns = [col for col in dataset.table.column_names if col != "Provinsi_Clean"] # Provinsi_Clean hanya jika diminta
+    selected_columns = ["Provinsi"] + [col for col in (requested_columns or default_columns) if col != "Provinsi"]
+
+    def build() -> Tuple[bytes, str]:
+        table = dataset.table
+        if provinsi_filter:
+            value_set = pa.array(provinsi_filter)
+            mask = pc.or_(pc.is_in(pc.utf8_upper(table["Provinsi"].cast(pa.string())), value_set=value_set),
+                          pc.is_in(table["Provinsi_Clean"].cast(pa.string()), value_set=value_set))
+            table = table.filter(mask)
+        meta = {**_snapshot_meta(dataset_key, latest_doc), "jumlah_baris": table.num_rows}
+        return _encode_table(table.select(selected_columns), output_format, meta)
+
+    return cached_response(request, ["data", dataset_key, ",".join(provinsi_filter), ",".join(selected_columns), output_format], build)
+
+
+@app.get("/v1/totals")
+def get_totals(request: Request,
+               tabel: str = Query(BPS_ID_TABEL_TARGET, description="ID Tabel BPS"),
+               tahun: str = Query(BPS_TAHUN_TARGET, description="Tahun data yang di-request scraper")) -> Response:
+    """Ringkasan nasional (agregat dari provinsi), sama dengan metrik di dashboard."""
+    dataset_key, dataset, latest_doc = get_dataset(tabel, tahun)
+
+    def build() -> Tuple[bytes, str]:
+        frame = dataset.frame
+        # Dijumlah di int64/float64 (bukan dtype kolom) agar total tidak overflow dan tidak kehilangan presisi
+        totals = {col: int(frame[col].to_numpy(dtype=np.int64).sum()) if pd.api.types.is_integer_dtype(frame[col])
+                  else float(frame[col].to_numpy(dtype=np.float64).sum())
+                  for col in COLUMN_MAP.values() if col in dataset.numeric_columns}
+        total_pencari = totals.get(dataset.pencari_col or "", 0)
+        # Rasio dibulatkan 4 desimal, sama dengan kolom rasio per provinsi (compute_ratio_columns)
+        totals[RASIO_LP_COL] = round(totals.get(dataset.lowongan_col or "", 0) / total_pencari, 4) if total_pencari else 0.0
+        totals[RASIO_PP_COL] = round(totals.get(dataset.penempatan_col or "", 0) / total_pencari, 4) if total_pencari else 0.0
+        return _dumps({"meta": {key: _json_value(value) for key, value in _snapshot_meta(dataset_key, latest_doc).items()}, "totals": totals}), MEDIA_TYPES["json"]
+
+    return cached_response(request, ["totals", dataset_key], build)
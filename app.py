@@ -3,16 +3,18 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from pymongo import MongoClient, errors as pymongo_errors
+from pymongo import errors as pymongo_errors
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timezone
-import numpy as np
-import requests
 import json
 import logging
 from typing import Dict, List, Optional, Any, Tuple
 import html
+from bps_dataset import SharedDataset, RASIO_LP_COL, RASIO_PP_COL
+from bps_loader import BackgroundLoader
+from bps_history import list_history_versions, rebuild_snapshot
+from bps_schema import COLUMN_MAP, apply_schema, is_schema_report_current
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s")
 
@@ -24,92 +26,105 @@ BPS_TAHUN_TARGET: str = "2024" # Sesuai scraper
 
 CLEANED_ID_TABEL_TARGET = BPS_ID_TABEL_TARGET.replace('=', '').replace('/', '')
 MONGO_COLLECTION_NAME: str = os.getenv("MONGO_COLLECTION_NAME", f"data_bps_{CLEANED_ID_TABEL_TARGET}_{BPS_TAHUN_TARGET}")
+MONGO_HISTORY_COLLECTION_NAME: str = os.getenv("MONGO_HISTORY_COLLECTION_NAME", f"{MONGO_COLLECTION_NAME}_history") # Sesuai scraper
 
 GEOJSON_URL: str = "https://raw.githubusercontent.com/superpikar/indonesia-geojson/master/indonesia-province-simple.json"
 GEOJSON_FEATURE_ID_KEY: str = "properties.Propinsi"
 
-# !! PENTING SEKALI: VERIFIKASI KUNCI ('id_var') DI BAWAH INI !!
-# Gunakan fitur debug di sidebar aplikasi untuk membandingkan dengan
-# "Definisi Variabel Aktual dari API BPS (tersimpan di DB)".
-# Kunci ('id_var') di COLUMN_MAP ini HARUS SAMA PERSIS dengan id_var dari API.
-COLUMN_MAP: Dict[str, str] = {
-    "iihviv2ocw": "Pencari Kerja Terdaftar - Laki-Laki",
-    "ijuxru3lvl": "Pencari Kerja Terdaftar - Perempuan",
-    "b1xjkdn0vw": "Pencari Kerja Terdaftar - Jumlah",
-    "kgpd8jp9bs": "Lowongan Kerja Terdaftar - Laki-Laki",
-    "b4ox1vczyq": "Lowongan Kerja Terdaftar - Perempuan",
-    "yeloqirlpp": "Lowongan Kerja Terdaftar - Jumlah",
-    "2ikzujodce": "Penempatan Tenaga Kerja - Laki-Laki",
-    "lfbbv5gdz2": "Penempatan Tenaga Kerja - Perempuan",
-    "ytis9poht5": "Penempatan Tenaga Kerja - Jumlah",
-    "ksybbjfehm": "Pencari Kerja Terdaftar - Laki-Laki atau Perempuan" # Verifikasi id_var ini!
-}
-
 st.set_page_config(page_title=PAGE_TITLE, layout="wide", page_icon=PAGE_ICON, initial_sidebar_state="expanded")
 
 load_dotenv()
 MONGO_URI: Optional[str] = os.getenv("MONGO_URI")
 
-@st.cache_resource(ttl=3600)
-def init_connection() -> Optional[MongoClient]: #... (fungsi init_connection sama seperti sebelumnya)
-    if not MONGO_URI:
-        st.sidebar.error("MONGO_URI tidak diatur. Atur di Secrets (Cloud) atau .env (Lokal).")
-        logging.error("MONGO_URI tidak diatur.")
-        return None
-    try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=10000, connectTimeoutMS=10000)
-        client.admin.command("ping")
-        logging.info(f"Berhasil terhubung ke MongoDB (DB: {MONGO_DATABASE_NAME}).")
-        return client
-    except Exception as e:
-        st.sidebar.error(f"Error koneksi MongoDB: {e}")
-        logging.error(f"Error init_connection: {e}", exc_info=True)
-    return None
-
-client = init_connection()
-if not client: st.error("Kritis: Gagal terhubung ke MongoDB.", icon="🚨"); st.stop()
+LOADER_WAIT_SECONDS: int = 15 # Batas tunggu skeleton sebelum rerun saat loader belum selesai muat pertama
+
+# Satu loader per proses server, dibagi semua sesi. Koneksi MongoDB, find_one, dan unduhan GeoJSON
+# berjalan paralel di thread latar belakang dan disegarkan sebelum TTL habis (lihat bps_loader.py).
+@st.cache_resource
+def get_background_loader() -> BackgroundLoader:
+    return BackgroundLoader(MONGO_URI, MONGO_DATABASE_NAME, MONGO_COLLECTION_NAME,
+                            BPS_ID_TABEL_TARGET, BPS_TAHUN_TARGET, GEOJSON_URL).start()
+
+if not MONGO_URI:
+    st.sidebar.error("MONGO_URI tidak diatur. Atur di Secrets (Cloud) atau .env (Lokal).")
+    logging.error("MONGO_URI tidak diatur.")
+    st.error("Kritis: Gagal terhubung ke MongoDB.", icon="🚨"); st.stop()
+
+loader = get_background_loader()
+loader_state = loader.snapshot()
+if not loader_state["ready"]:
+    # Skeleton selama muat pertama, lalu rerun begitu loader siap (tanpa memblokir thread lain)
+    st.title(PAGE_TITLE)
+    st.info("⏳ Sedang memuat data terbaru dari MongoDB & GeoJSON di latar belakang...")
+    skeleton_cols = st.columns(3)
+    for skeleton_col, skeleton_label in zip(skeleton_cols, ["Total Pencari Kerja", "Total Lowongan Kerja", "Total Penempatan"]):
+        skeleton_col.metric(skeleton_label, "…")
+    loader.wait_until_ready(timeout=LOADER_WAIT_SECONDS)
+    st.rerun()
+
+client = loader_state["client"]
+if not client:
+    st.sidebar.error(f"Error koneksi MongoDB: {loader_state['errors'].get('mongo', 'N/A')}")
+    st.error("Kritis: Gagal terhubung ke MongoDB.", icon="🚨"); st.stop()
 db = client[MONGO_DATABASE_NAME]
-collection = db[MONGO_COLLECTION_NAME]
-st.sidebar.success(f"Terhubung ke MongoDB (Collection: {MONGO_COLLECTION_NAME}).")
+history_collection = db[MONGO_HISTORY_COLLECTION_NAME]
+if "mongo" in loader_state["errors"]:
+    st.sidebar.warning(f"Refresh MongoDB gagal, menampilkan data terakhir yang berhasil dimuat: {loader_state['errors']['mongo']}")
+else:
+    st.sidebar.success(f"Terhubung ke MongoDB (Collection: {MONGO_COLLECTION_NAME}).")
+if "geojson" in loader_state["errors"]:
+    st.sidebar.error(f"Error memuat GeoJSON: {loader_state['errors']['geojson']}")
 
+# latest_doc_key (timestamp dokumen utama) ikut jadi kunci cache, jadi daftar versi disegarkan
+# bersamaan dengan dokumen dari loader dan tidak pernah lebih tua dari data yang ditampilkan.
 @st.cache_data(ttl=900)
-def get_latest_data_from_db(target_id_tabel: str, target_tahun: str) -> Optional[Dict[str, Any]]: #... (fungsi get_latest_data_from_db sama)
+def get_history_versions(target_id_tabel: str, target_tahun: str, latest_doc_key: str) -> List[Dict[str, Any]]:
     try:
-        query_filter = {"bps_id_tabel": target_id_tabel, "bps_tahun_data_request": target_tahun}
-        latest_document = collection.find_one(query_filter)
-        if latest_document:
-            logging.info(f"Data terbaru diambil dari DB (filter: {query_filter}), ts scrape: {latest_document.get('timestamp_scraped_utc')}")
-        else:
-            logging.warning(f"Tidak ada dokumen ditemukan di MongoDB dengan filter: {query_filter}.")
-        return latest_document
+        return list_history_versions(history_collection, target_id_tabel, target_tahun)
     except Exception as e:
-        st.error(f"Error mengambil data dari MongoDB: {e}")
-        logging.error(f"Error get_latest_data_from_db: {e}", exc_info=True)
-    return None
+        logging.error(f"Error get_history_versions: {e}", exc_info=True)
+    return []
 
+# Versi riwayat bersifat immutable, jadi hasil rekonstruksi aman di-cache lama (content_hash ikut jadi kunci cache)
 @st.cache_data(ttl=86400)
-def get_geojson_data(url: str) -> Optional[Dict[str, Any]]: #... (fungsi get_geojson_data sama)
+def get_snapshot_as_of(target_id_tabel: str, target_tahun: str, versi: int, content_hash: str) -> Optional[Dict[str, Any]]:
     try:
-        st.sidebar.info(f"Memuat GeoJSON dari: {url.split('/')[-1]}")
-        response = requests.get(url, timeout=20)
-        response.raise_for_status()
-        geojson = response.json()
-        if isinstance(geojson, dict) and geojson.get("type") in ["FeatureCollection", "Feature"]:
-            st.sidebar.success("GeoJSON berhasil dimuat.")
-            return geojson
-        st.sidebar.warning(f"Format GeoJSON tidak sesuai dari URL: {url}")
+        return rebuild_snapshot(history_collection, target_id_tabel, target_tahun, versi)
     except Exception as e:
-        st.sidebar.error(f"Error memuat GeoJSON: {e}")
-        logging.error(f"Error get_geojson_data dari {url}: {e}", exc_info=True)
+        st.error(f"Error membangun ulang snapshot versi {versi}: {e}")
+        logging.error(f"Error get_snapshot_as_of (versi {versi}): {e}", exc_info=True)
     return None
 
 
-latest_doc = get_latest_data_from_db(BPS_ID_TABEL_TARGET, BPS_TAHUN_TARGET)
-geojson_data = get_geojson_data(GEOJSON_URL)
+latest_doc = loader_state["latest_doc"]
+geojson_data = loader_state["geojson"]
 
 if not latest_doc:
     st.error(f"⚠️ Tidak ada data untuk ID Tabel '{BPS_ID_TABEL_TARGET}' Tahun '{BPS_TAHUN_TARGET}'. Pastikan scraper sudah jalan & simpan ke koleksi '{MONGO_COLLECTION_NAME}'.", icon="🚨")
     st.stop()
+
+# --- Pemilih "Data per" (Riwayat Snapshot) ---
+history_versions = get_history_versions(BPS_ID_TABEL_TARGET, BPS_TAHUN_TARGET, str(latest_doc.get("timestamp_scraped_utc")))
+# Opsi "Terbaru" selalu berasal dari latest_doc; versi riwayat yang isinya sama dengan dokumen utama tidak diulang
+latest_content_hash = latest_doc.get("content_hash")
+older_versions = [version for version in history_versions if version.get("content_hash") != latest_content_hash] if latest_content_hash else history_versions[1:]
+if older_versions:
+    def format_history_version(version: Optional[Dict[str, Any]]) -> str:
+        ts_version = (version or latest_doc).get("timestamp_scraped_utc")
+        ts_label = ts_version.strftime("%d %b %Y, %H:%M") if isinstance(ts_version, datetime) else str(ts_version)
+        if version is None:
+            return f"Terbaru - {ts_label}"
+        return f"v{version.get('versi')} - {ts_label} ({str(version.get('content_hash', ''))[:8]})"
+
+    selected_version = st.sidebar.selectbox("Data per (riwayat snapshot):", options=[None] + older_versions, index=0, format_func=format_history_version)
+    if selected_version is not None: # None = dokumen utama (terbaru), tidak perlu rekonstruksi
+        snapshot_as_of = get_snapshot_as_of(BPS_ID_TABEL_TARGET, BPS_TAHUN_TARGET, selected_version["versi"], selected_version["content_hash"])
+        if snapshot_as_of:
+            latest_doc = {key: value for key, value in latest_doc.items() if key not in ["data_provinsi_typed", "validasi_skema"]} # Hasil tahap skema milik versi terbaru
+            latest_doc.update({key: snapshot_as_of[key] for key in ["timestamp_scraped_utc", "bps_tahun_data_actual", "metadata_tabel_scraped", "data_provinsi", "content_hash"]})
+            st.sidebar.warning(f"Menampilkan snapshot historis versi {snapshot_as_of['versi']}, bukan data terbaru.")
+        else:
+            st.sidebar.error(f"Snapshot versi {selected_version['versi']} gagal dibangun ulang, menampilkan data terbaru.")
 list_data_provinsi_mentah: Optional[List[Dict[str, Any]]] = latest_doc.get("data_provinsi")
 if not list_data_provinsi_mentah or not isinstance(list_data_provinsi_mentah, list):
     st.error(f"⚠️ 'data_provinsi' tidak ditemukan/valid di dokumen MongoDB.", icon="🚨")
@@ -129,117 +144,62 @@ if isinstance(metadata_tabel_scraped, dict):
     st.sidebar.caption(f"Tahun Aktual (DB): {latest_doc.get('bps_tahun_data_actual', metadata_tabel_scraped.get('tahun_data', 'N/A'))}")
 st.sidebar.caption(f"ID Tabel Target: {latest_doc.get('bps_id_tabel', BPS_ID_TABEL_TARGET)}")
 
-def parse_bps_value(raw_value_object: Any) -> float: #... (fungsi parse_bps_value sama)
-    raw_value_string = "0"
-    if isinstance(raw_value_object, dict):
-        possible_keys = ["value_raw", "val", "nilai"]
-        for key in possible_keys:
-            if key in raw_value_object and raw_value_object[key] is not None:
-                raw_value_string = str(raw_value_object[key]); break
-        else:
-            if len(raw_value_object) == 1 and list(raw_value_object.values())[0] is not None:
-                 raw_value_string = str(list(raw_value_object.values())[0])
-    elif isinstance(raw_value_object, (str, int, float)) and raw_value_object is not None:
-        raw_value_string = str(raw_value_object)
-    cleaned_value_string = raw_value_string.replace(".", "").replace(",", ".")
-    try: return float(cleaned_value_string)
-    except ValueError: return 0.0
-
-def create_dataframe_from_bps_data(data_prov_list: List[Dict[str, Any]], col_map: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]], List[Dict[str, Any]]]: #... (fungsi create_dataframe_from_bps_data sama)
-    rows, debug_rows, missing_keys = [], [], {}
-    for idx, item_prov in enumerate(data_prov_list):
-        label_prov = item_prov.get("label", f"Prov Unknown #{idx}")
-        if label_prov.strip().upper() == "INDONESIA": continue
-        row_data: Dict[str, Any] = {"Provinsi": label_prov}
-        vars_prov: Dict[str, Any] = item_prov.get("variables", {})
-        debug_item: Dict[str, Any] = {"Provinsi": label_prov, "_API_VAR_KEYS": list(vars_prov.keys())}
-        for api_id, col_name in col_map.items():
-            raw_val_obj = vars_prov.get(api_id)
-            if raw_val_obj is None:
-                row_data[col_name] = 0.0
-                debug_item[f"NOT_FOUND: {api_id} (as {col_name})"] = "MISSING"
-                missing_keys.setdefault(api_id, {"col_name": col_name, "miss_count": 0})["miss_count"] += 1
-            else:
-                row_data[col_name] = parse_bps_value(raw_val_obj)
-                debug_item[f"RAW: {api_id} ({col_name})"] = str(raw_val_obj)
-            debug_item[f"PROCESSED: {col_name}"] = row_data.get(col_name)
-        rows.append(row_data)
-        if idx < 3: debug_rows.append(debug_item)
-    return pd.DataFrame(rows), missing_keys, debug_rows
-
-df_provinsi, keys_not_found_in_api, debug_data_processing_examples = create_dataframe_from_bps_data(list_data_provinsi_mentah, COLUMN_MAP)
-
-# --- Enhanced Debugging Sidebar ---
-with st.sidebar.expander("🔬 WAJIB DICEK: Validasi `COLUMN_MAP`", expanded=True):
-    st.error("PERHATIAN: Pastikan KUNCI (`id_var`) di `COLUMN_MAP` di bawah ini SAMA PERSIS dengan KUNCI (`id_var`) di 'Definisi Variabel Aktual dari API BPS'. Jika berbeda, data di grafik akan salah (nol).")
-    st.subheader("`COLUMN_MAP` yang Digunakan Aplikasi Ini:")
-    st.json(COLUMN_MAP)
-
-    scraped_var_defs = None
-    if isinstance(metadata_tabel_scraped, dict) and "kolom" in metadata_tabel_scraped:
-        scraped_var_defs = metadata_tabel_scraped["kolom"]
-        if isinstance(scraped_var_defs, dict):
-            st.subheader("Definisi Variabel Aktual dari API BPS (tersimpan di DB):")
-            st.caption("Cocokkan KUNCI (`id_var`) dari `COLUMN_MAP` Anda dengan KUNCI di sini.")
-            st.json(scraped_var_defs, expanded=False)
-        else:
-            st.warning("Format `metadata_tabel_scraped.kolom` tidak sesuai (bukan dictionary).")
-            scraped_var_defs = None # Reset jika format salah
+# Fallback untuk dokumen lama / snapshot historis yang belum melewati tahap skema di scraper
+@st.cache_data(ttl=900)
+def get_typed_rows(data_prov_list: List[Dict[str, Any]], metadata_tabel: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    return apply_schema(data_prov_list, metadata_tabel, COLUMN_MAP)
+
+typed_rows, validasi_skema = latest_doc.get("data_provinsi_typed"), latest_doc.get("validasi_skema")
+if not isinstance(typed_rows, list) or not is_schema_report_current(validasi_skema):
+    typed_rows, validasi_skema = get_typed_rows(list_data_provinsi_mentah, metadata_tabel_scraped)
+    st.sidebar.caption("Data divalidasi ulang di dashboard (dokumen belum/berbeda versi tahap skema scraper).")
+
+# Dataset ringkas & read-only dibagi semua sesi (tanpa pickle/copy per sesi seperti st.cache_data).
+# Kunci cukup identitas snapshot; isi baris tidak perlu di-hash ulang di setiap rerun.
+@st.cache_resource(max_entries=8)
+def get_shared_dataset(dataset_key: str, _typed_rows: List[Dict[str, Any]]) -> SharedDataset:
+    return SharedDataset(_typed_rows, COLUMN_MAP)
+
+dataset = get_shared_dataset(f"{BPS_ID_TABEL_TARGET}|{BPS_TAHUN_TARGET}|{latest_doc.get('timestamp_scraped_utc')}", typed_rows)
+
+# --- Laporan Validasi Skema (disusun sekali saat ingest oleh scraper) ---
+with st.sidebar.expander("🔬 Validasi `COLUMN_MAP`", expanded=not validasi_skema.get("valid", False)):
+    if validasi_skema.get("valid"):
+        st.success("Semua id_var di `COLUMN_MAP` ditemukan di definisi 'kolom' API dan di data provinsi.")
     else:
+        st.error("PERHATIAN: Ada KUNCI (`id_var`) di `COLUMN_MAP` (bps_schema.py) yang tidak cocok dengan API BPS. Data kolom tersebut akan bernilai nol.")
+    if not validasi_skema.get("kolom_tersedia"):
         st.warning("Metadata 'kolom' (definisi variabel dari API) tidak ditemukan di data DB. Scraper perlu menyimpan `metadata_tabel_scraped.kolom` untuk validasi otomatis.")
 
-    # Tabel Perbandingan untuk Validasi COLUMN_MAP
-    validation_data = []
-    for app_id_var, app_col_name in COLUMN_MAP.items():
-        status = "❌ TIDAK DITEMUKAN DI API"
-        api_nama_variabel = "N/A"
-        if scraped_var_defs and app_id_var in scraped_var_defs:
-            status = "✅ DITEMUKAN"
-            api_nama_variabel = scraped_var_defs[app_id_var].get("nama_variabel", "Nama variabel tidak ada di API def")
-        elif keys_not_found_in_api.get(app_id_var): # Fallback jika scraped_var_defs tidak ada tapi keys_not_found ada
-             status = "❌ TIDAK DITEMUKAN DI DATA PROVINSI"
-
-        validation_data.append({
-            "ID Var (COLUMN_MAP)": app_id_var,
-            "Nama Kolom Aplikasi": app_col_name,
-            "Status Pemetaan": status,
-            "Nama Var. Aktual di API (jika ditemukan)": api_nama_variabel
-        })
     st.subheader("Tabel Validasi Pemetaan `COLUMN_MAP`:")
-    st.dataframe(pd.DataFrame(validation_data), use_container_width=True, hide_index=True)
-    
-    if not df_provinsi.empty:
-        st.subheader("Contoh Proses Konversi Variabel (Beberapa Provinsi Awal)")
-        st.json(debug_data_processing_examples, expanded=False)
-        if keys_not_found_in_api: # Hanya tampilkan jika ada yang tidak ditemukan
-            st.subheader("Ringkasan ID Variabel dari `COLUMN_MAP` yang TIDAK DITEMUKAN di Data Provinsi:")
-            st.warning("ID Variabel (KUNCI) berikut dari `COLUMN_MAP` tidak ditemukan di data provinsi yang di-scrape. Perbaiki `COLUMN_MAP` Anda!")
-            st.json(keys_not_found_in_api)
-        elif scraped_var_defs: # Jika semua ada di data provinsi, cek lagi vs definisi kolom API
-            mismatched_but_found_in_data = []
-            for app_id_var in COLUMN_MAP.keys():
-                if app_id_var not in scraped_var_defs:
-                    mismatched_but_found_in_data.append(f"'{app_id_var}' (ada di data provinsi) tapi tidak ada di definisi kolom API BPS.")
-            if mismatched_but_found_in_data:
-                 st.warning("Beberapa id_var di COLUMN_MAP ada di data provinsi tapi tidak terdefinisi di metadata 'kolom' dari API:" + "; ".join(mismatched_but_found_in_data))
-
-
-        st.subheader("DataFrame `df_provinsi` (Info & 5 Baris Awal)")
-        st.dataframe(df_provinsi.head())
-    else: st.warning("DataFrame `df_provinsi` kosong setelah pemrosesan.")
-
-if df_provinsi.empty:
+    st.dataframe(pd.DataFrame(validasi_skema.get("status_pemetaan", [])).rename(columns={
+        "id_var": "ID Var (COLUMN_MAP)", "nama_kolom": "Nama Kolom Aplikasi",
+        "status": "Status Pemetaan", "nama_variabel_api": "Nama Var. Aktual di API (jika ditemukan)"
+    }), use_container_width=True, hide_index=True)
+
+    keys_not_found_in_api = validasi_skema.get("id_var_tidak_ditemukan_di_data", {})
+    if keys_not_found_in_api:
+        st.warning("ID Variabel (KUNCI) berikut dari `COLUMN_MAP` tidak ditemukan di data provinsi yang di-scrape: " +
+                   ", ".join(f"'{id_var}' ({info['col_name']}, hilang di {info['miss_count']} provinsi)" for id_var, info in keys_not_found_in_api.items()))
+    elif validasi_skema.get("id_var_tidak_ada_di_kolom_api"):
+        st.warning("Beberapa id_var di COLUMN_MAP ada di data provinsi tapi tidak terdefinisi di metadata 'kolom' dari API: " +
+                   ", ".join(validasi_skema["id_var_tidak_ada_di_kolom_api"]))
+    st.caption(f"{validasi_skema.get('jumlah_provinsi', 0)} provinsi, {len(validasi_skema.get('kolom_api_tidak_dipetakan', []))} variabel API tidak dipetakan.")
+
+if len(dataset) == 0:
     st.error("DataFrame kosong setelah pemrosesan. Visualisasi tidak bisa ditampilkan. Periksa `COLUMN_MAP` Anda!", icon="🚨")
     st.stop()
 
-# --- 6. Transformasi Data Lanjutan --- (Sama seperti sebelumnya)
-df_calc = df_provinsi.copy()
-df_calc['Provinsi_Clean'] = df_calc['Provinsi'].str.upper() \
-    .str.replace('DKI ', '', regex=False).str.replace('DI ', '', regex=False) \
-    .str.replace('DAERAH ISTIMEWA ', '', regex=False) \
-    .str.replace(r'KEP\.\s', 'KEPULAUAN ', regex=True).str.replace('KEP ', 'KEPULAUAN ', regex=False) \
-    .str.replace(r'PROP\.\s', 'PROVINSI ', regex=True).str.replace('PROV ', 'PROVINSI ', regex=False) \
-    .str.strip()
+with st.sidebar.expander("💾 Laporan Memori Dataset", expanded=False):
+    memory_report = dataset.memory_report()
+    st.caption(f"{memory_report['jumlah_baris']} provinsi | Arrow: {memory_report['bytes_arrow']:,} B | "
+               f"Representasi lama (object + float64): {memory_report['bytes_representasi_lama']:,} B | "
+               f"Hemat {memory_report['rasio_penghematan']:.0%}")
+    st.dataframe(pd.DataFrame(memory_report["per_kolom"]), use_container_width=True, hide_index=True)
+
+# --- 6. Transformasi Data Lanjutan --- (Provinsi_Clean & rasio dihitung sekali di SharedDataset)
+df_calc = dataset.frame # Salinan dangkal: buffer dibagi antar sesi (read-only), kolom baru hanya berlaku di sesi ini
+kolom_numerik = dataset.numeric_columns
 
 pencari_lk_col = COLUMN_MAP.get("iihviv2ocw")
 pencari_pr_col = COLUMN_MAP.get("ijuxru3lvl")
@@ -251,22 +211,16 @@ penempatan_lk_col = COLUMN_MAP.get("2ikzujodce")
 penempatan_pr_col = COLUMN_MAP.get("lfbbv5gdz2")
 penempatan_jml_col = COLUMN_MAP.get("ytis9poht5")
 
-rasio_lp_col, rasio_pp_col = "Rasio Lowongan/Pencari", "Rasio Penempatan/Pencari"
-if pencari_jml_col and lowongan_jml_col and penempatan_jml_col and \
-   all(col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[col]) for col in [pencari_jml_col, lowongan_jml_col, penempatan_jml_col]):
-    df_calc[rasio_lp_col] = np.where(df_calc[pencari_jml_col] > 0, df_calc[lowongan_jml_col] / df_calc[pencari_jml_col], 0.0)
-    df_calc[rasio_pp_col] = np.where(df_calc[pencari_jml_col] > 0, df_calc[penempatan_jml_col] / df_calc[pencari_jml_col], 0.0)
-    for col_r in [rasio_lp_col, rasio_pp_col]: df_calc[col_r] = df_calc[col_r].replace([np.inf, -np.inf], 0.0).round(4)
-else:
+rasio_lp_col, rasio_pp_col = RASIO_LP_COL, RASIO_PP_COL
+if not dataset.ratios_valid:
     st.warning(f"Tidak dapat menghitung rasio. Kolom dasar mungkin tidak ada/valid karena `COLUMN_MAP` belum tepat.")
-    df_calc[rasio_lp_col], df_calc[rasio_pp_col] = 0.0, 0.0
 
 # --- 7. Layout Utama & Metrik Nasional --- (Sama seperti sebelumnya)
 st.title(PAGE_TITLE)
 st.markdown(f"Data dari DB per: {doc_timestamp_str} (Tahun Data Aktual: {latest_doc.get('bps_tahun_data_actual', 'N/A')})")
-total_pencari = df_calc[pencari_jml_col].sum() if pencari_jml_col and pencari_jml_col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[pencari_jml_col]) else 0
-total_lowongan = df_calc[lowongan_jml_col].sum() if lowongan_jml_col and lowongan_jml_col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[lowongan_jml_col]) else 0
-total_penempatan = df_calc[penempatan_jml_col].sum() if penempatan_jml_col and penempatan_jml_col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[penempatan_jml_col]) else 0
+total_pencari = df_calc[pencari_jml_col].sum() if pencari_jml_col and pencari_jml_col in kolom_numerik else 0
+total_lowongan = df_calc[lowongan_jml_col].sum() if lowongan_jml_col and lowongan_jml_col in kolom_numerik else 0
+total_penempatan = df_calc[penempatan_jml_col].sum() if penempatan_jml_col and penempatan_jml_col in kolom_numerik else 0
 st.subheader("Ringkasan Nasional (Agregat dari Provinsi)")
 col_met1, col_met2, col_met3 = st.columns(3)
 col_met1.metric("Total Pencari Kerja", f"{total_pencari:,.0f}")
@@ -282,7 +236,7 @@ tab_ringkasan, tab_gender, tab_hubungan, tab_tabel, tab_peta = st.tabs([
 
 def safe_plot_bar(df: pd.DataFrame, val_col: Optional[str], cat_col: str, title: str, orientation: str = 'v', color_seq=None, is_ratio=False): #... (fungsi safe_plot_bar sama seperti versi terakhir, dengan hover eksplisit)
     if not val_col: st.warning(f"Nama kolom untuk nilai pada grafik '{title}' tidak terdefinisi (cek `COLUMN_MAP`)."); return
-    if val_col in df.columns and cat_col in df.columns and pd.api.types.is_numeric_dtype(df[val_col]):
+    if val_col in kolom_numerik and cat_col in df.columns:
         with st.container(border=True):
             top_n = df.dropna(subset=[val_col]).nlargest(10, val_col)
             if top_n.empty or (top_n[val_col].sum() == 0 and not is_ratio):
@@ -321,7 +275,7 @@ with tab_ringkasan: #... (Konten tab_ringkasan sama seperti versi terakhir)
     with plot_cols_r2[0]:
         scatter_req_cols = [pencari_jml_col, penempatan_jml_col, lowongan_jml_col, rasio_pp_col]
         if pencari_jml_col and penempatan_jml_col and lowongan_jml_col and rasio_pp_col and \
-           all(col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[col]) for col in scatter_req_cols):
+           all(col in kolom_numerik for col in scatter_req_cols):
             with st.container(border=True):
                 fig_scatter_penempatan = px.scatter(df_calc, x=pencari_jml_col, y=penempatan_jml_col, size=lowongan_jml_col, color=rasio_pp_col,
                                           color_continuous_scale=px.colors.sequential.Plasma, hover_name="Provinsi",
@@ -343,13 +297,12 @@ with tab_gender: #... (Konten tab_gender sama seperti versi terakhir, dengan hov
     if pencari_lk_col and pencari_pr_col and pencari_jml_col and \
        all(col in df_calc.columns for col in ["Provinsi", pencari_lk_col, pencari_pr_col, pencari_jml_col]):
         with st.container(border=True):
-            top_provinces_pencari = df_calc.nlargest(10, pencari_jml_col)
-            if not top_provinces_pencari.empty:
-                df_melted_pencari = top_provinces_pencari.melt(id_vars=["Provinsi"], value_vars=[pencari_lk_col, pencari_pr_col], var_name="Jenis Kelamin", value_name="Jumlah Pencari Kerja")
+            top_provinces_pencari, df_melted_pencari = dataset.gender_top_long(pencari_lk_col, pencari_pr_col, pencari_jml_col, "Jumlah Pencari Kerja")
+            if top_provinces_pencari:
                 fig_gender_pencari = px.bar(df_melted_pencari, x="Provinsi", y="Jumlah Pencari Kerja", color="Jenis Kelamin", barmode="group",
                                             title=f"Pencari Kerja L/P (Top 10 Prov. by Total)", text_auto=True,
                                             hover_name="Provinsi", hover_data={"Jenis Kelamin": True, "Jumlah Pencari Kerja": hover_format_jumlah},
-                                            labels={"Jumlah Pencari Kerja": "Jumlah Orang"}, category_orders={"Provinsi": top_provinces_pencari["Provinsi"].tolist()})
+                                            labels={"Jumlah Pencari Kerja": "Jumlah Orang"}, category_orders={"Provinsi": top_provinces_pencari})
                 fig_gender_pencari.update_traces(texttemplate='%{text:,.0f}')
                 fig_gender_pencari.update_layout(title_x=0.5, uniformtext_minsize=8, uniformtext_mode='hide')
                 st.plotly_chart(fig_gender_pencari, use_container_width=True)
@@ -359,13 +312,12 @@ with tab_gender: #... (Konten tab_gender sama seperti versi terakhir, dengan hov
     if lowongan_lk_col and lowongan_pr_col and lowongan_jml_col and \
        all(col in df_calc.columns for col in ["Provinsi", lowongan_lk_col, lowongan_pr_col, lowongan_jml_col]):
         with st.container(border=True):
-            top_provinces_lowongan = df_calc.nlargest(10, lowongan_jml_col)
-            if not top_provinces_lowongan.empty:
-                df_melted_lowongan = top_provinces_lowongan.melt(id_vars=["Provinsi"], value_vars=[lowongan_lk_col, lowongan_pr_col], var_name="Jenis Kelamin", value_name="Jumlah Lowongan")
+            top_provinces_lowongan, df_melted_lowongan = dataset.gender_top_long(lowongan_lk_col, lowongan_pr_col, lowongan_jml_col, "Jumlah Lowongan")
+            if top_provinces_lowongan:
                 fig_gender_lowongan = px.bar(df_melted_lowongan, x="Provinsi", y="Jumlah Lowongan", color="Jenis Kelamin", barmode="group",
                                             title=f"Lowongan Kerja L/P (Top 10 Prov. by Total)", text_auto=True,
                                             hover_name="Provinsi", hover_data={"Jenis Kelamin": True, "Jumlah Lowongan": hover_format_jumlah},
-                                            labels={"Jumlah Lowongan": "Jumlah Jabatan"}, category_orders={"Provinsi": top_provinces_lowongan["Provinsi"].tolist()})
+                                            labels={"Jumlah Lowongan": "Jumlah Jabatan"}, category_orders={"Provinsi": top_provinces_lowongan})
                 fig_gender_lowongan.update_traces(texttemplate='%{text:,.0f}')
                 fig_gender_lowongan.update_layout(title_x=0.5, uniformtext_minsize=8, uniformtext_mode='hide')
                 st.plotly_chart(fig_gender_lowongan, use_container_width=True)
@@ -375,13 +327,12 @@ with tab_gender: #... (Konten tab_gender sama seperti versi terakhir, dengan hov
     if penempatan_lk_col and penempatan_pr_col and penempatan_jml_col and \
        all(col in df_calc.columns for col in ["Provinsi", penempatan_lk_col, penempatan_pr_col, penempatan_jml_col]):
         with st.container(border=True):
-            top_provinces_penempatan = df_calc.nlargest(10, penempatan_jml_col)
-            if not top_provinces_penempatan.empty:
-                df_melted_penempatan = top_provinces_penempatan.melt(id_vars=["Provinsi"], value_vars=[penempatan_lk_col, penempatan_pr_col], var_name="Jenis Kelamin", value_name="Jumlah Penempatan")
+            top_provinces_penempatan, df_melted_penempatan = dataset.gender_top_long(penempatan_lk_col, penempatan_pr_col, penempatan_jml_col, "Jumlah Penempatan")
+            if top_provinces_penempatan:
                 fig_gender_penempatan = px.bar(df_melted_penempatan, x="Provinsi", y="Jumlah Penempatan", color="Jenis Kelamin", barmode="group",
                                             title=f"Penempatan L/P (Top 10 Prov. by Total)", text_auto=True,
                                             hover_name="Provinsi", hover_data={"Jenis Kelamin": True, "Jumlah Penempatan": hover_format_jumlah},
-                                            labels={"Jumlah Penempatan": "Jumlah Orang"}, category_orders={"Provinsi": top_provinces_penempatan["Provinsi"].tolist()})
+                                            labels={"Jumlah Penempatan": "Jumlah Orang"}, category_orders={"Provinsi": top_provinces_penempatan})
                 fig_gender_penempatan.update_traces(texttemplate='%{text:,.0f}')
                 fig_gender_penempatan.update_layout(title_x=0.5, uniformtext_minsize=8, uniformtext_mode='hide')
                 st.plotly_chart(fig_gender_penempatan, use_container_width=True)
@@ -394,7 +345,7 @@ with tab_hubungan: #... (Konten tab_hubungan sama seperti versi terakhir dengan
     required_numeric_cols_for_scatter1 = [pencari_jml_col, lowongan_jml_col, penempatan_jml_col]
     provinsi_col_exists_scatter1 = "Provinsi" in df_calc.columns
     numeric_cols_valid_scatter1 = pencari_jml_col and lowongan_jml_col and penempatan_jml_col and all(
-        col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[col]) for col in required_numeric_cols_for_scatter1)
+        col in kolom_numerik for col in required_numeric_cols_for_scatter1)
 
     if provinsi_col_exists_scatter1 and numeric_cols_valid_scatter1:
         with st.container(border=True):
@@ -415,7 +366,7 @@ with tab_hubungan: #... (Konten tab_hubungan sama seperti versi terakhir dengan
         st.warning(f"Scatter plot Lowongan vs Pencari tidak dapat ditampilkan. Masalah: {'; '.join(missing_details_scatter1) if missing_details_scatter1 else 'Kolom tidak lengkap/valid.'}")
 
     numeric_cols_for_corr = [pencari_lk_col, pencari_pr_col, pencari_jml_col, lowongan_lk_col, lowongan_pr_col, lowongan_jml_col, penempatan_lk_col, penempatan_pr_col, penempatan_jml_col, rasio_lp_col, rasio_pp_col]
-    valid_numeric_cols_for_corr = [col for col in numeric_cols_for_corr if col and col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[col])]
+    valid_numeric_cols_for_corr = [col for col in numeric_cols_for_corr if col and col in kolom_numerik]
     if len(valid_numeric_cols_for_corr) > 2 :
         with st.container(border=True):
             corr_df = df_calc[valid_numeric_cols_for_corr].fillna(0)
@@ -431,8 +382,8 @@ with tab_hubungan: #... (Konten tab_hubungan sama seperti versi terakhir dengan
 
 with tab_tabel: #... (Konten tab_tabel sama seperti versi terakhir)
     st.subheader("Tabel Data Lengkap Ketenagakerjaan per Provinsi")
-    cols_from_map_valid = [name for id_var, name in COLUMN_MAP.items() if name and name in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[name])]
-    cols_rasio_valid = [col for col in [rasio_lp_col, rasio_pp_col] if col and col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[col])]
+    cols_from_map_valid = [name for id_var, name in COLUMN_MAP.items() if name and name in kolom_numerik]
+    cols_rasio_valid = [col for col in [rasio_lp_col, rasio_pp_col] if col and col in kolom_numerik]
     display_order_cols = ["Provinsi"] + \
                      [COLUMN_MAP[id_var] for id_var in COLUMN_MAP if COLUMN_MAP.get(id_var) and COLUMN_MAP.get(id_var) in cols_from_map_valid] + \
                      sorted(list(set(cols_rasio_valid)))
@@ -456,7 +407,8 @@ with tab_tabel: #... (Konten tab_tabel sama seperti versi terakhir)
 
 with tab_peta: #... (Konten tab_peta sama seperti versi terakhir, menggunakan choropleth_map)
     st.subheader("🗺️ Peta Distribusi Ketenagakerjaan")
-    if not geojson_data: st.error("Data GeoJSON tidak dapat dimuat.", icon="🗺️")
+    if not geojson_data and "geojson" not in loader_state["errors"]: st.info("⏳ GeoJSON masih dimuat di latar belakang, muat ulang halaman sebentar lagi.", icon="🗺️")
+    elif not geojson_data: st.error("Data GeoJSON tidak dapat dimuat.", icon="🗺️")
     elif df_calc.empty or 'Provinsi_Clean' not in df_calc.columns: st.warning("DataFrame kosong atau 'Provinsi_Clean' tidak ada.", icon="🗺️")
     else:
         map_opts_all = {key: val for key, val in { # Gunakan nama kolom dari variabel yang sudah di-resolve
@@ -467,7 +419,7 @@ with tab_peta: #... (Konten tab_peta sama seperti versi terakhir, menggunakan ch
             rasio_pp_col: rasio_pp_col
         }.items() if val}
         
-        map_opts_valid = {disp: col for disp, col in map_opts_all.items() if col and col in df_calc.columns and pd.api.types.is_numeric_dtype(df_calc[col])}
+        map_opts_valid = {disp: col for disp, col in map_opts_all.items() if col and col in kolom_numerik}
         if not map_opts_valid: st.warning("Tidak ada metrik valid untuk peta.", icon="🗺️")
         else:
             sel_map_metric_disp = st.selectbox("Pilih Indikator Peta:", options=list(map_opts_valid.keys()), index=0)
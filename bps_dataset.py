@@ -0,0 +1,148 @@
+import threading
+from typing import Dict, List, Optional, Any, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from bps_schema import COLUMN_MAP
+
+RASIO_LP_COL = "Rasio Lowongan/Pencari"
+RASIO_PP_COL = "Rasio Penempatan/Pencari"
+
+# Nilai integer hingga batas ini bisa disimpan di int32 tanpa kehilangan presisi
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def clean_province_names(provinsi: pd.Series) -> pd.Series:
+    """Menyeragamkan nama provinsi agar cocok dengan properti 'Propinsi' di GeoJSON."""
+    return provinsi.astype(str).str.upper() \
+        .str.replace('DKI ', '', regex=False).str.replace('DI ', '', regex=False) \
+        .str.replace('DAERAH ISTIMEWA ', '', regex=False) \
+        .str.replace(r'KEP\.\s', 'KEPULAUAN ', regex=True).str.replace('KEP ', 'KEPULAUAN ', regex=False) \
+        .str.replace(r'PROP\.\s', 'PROVINSI ', regex=True).str.replace('PROV ', 'PROVINSI ', regex=False) \
+        .str.strip()
+
+
+def compute_ratio_columns(frame: pd.DataFrame, pencari_col: Optional[str], lowongan_col: Optional[str], penempatan_col: Optional[str]) -> Optional[Dict[str, np.ndarray]]:
+    """Menghitung rasio lowongan/pencari & penempatan/pencari; None jika kolom dasar tidak tersedia."""
+    if not (pencari_col and lowongan_col and penempatan_col and all(col in frame.columns for col in [pencari_col, lowongan_col, penempatan_col])):
+        return None
+    pencari = frame[pencari_col].to_numpy(dtype=np.float64)
+    ratios = {}
+    for ratio_col, numerator_col in [(RASIO_LP_COL, lowongan_col), (RASIO_PP_COL, penempatan_col)]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(pencari > 0, frame[numerator_col].to_numpy(dtype=np.float64) / pencari, 0.0)
+        ratios[ratio_col] = np.round(np.where(np.isfinite(ratio), ratio, 0.0), 4)
+    return ratios
+
+
+def _compact_numeric_array(values: np.ndarray) -> pa.Array:
+    """int32 hanya jika setiap nilai kembali persis sama setelah downcast (hitungan orang/jabatan), selain itu float64."""
+    if values.size and np.all(np.isfinite(values)) and np.abs(values).max() <= INT32_MAX:
+        as_int32 = values.astype(np.int32)
+        if np.array_equal(as_int32.astype(np.float64), values):
+            return pa.array(as_int32)
+    return pa.array(values.astype(np.float64))
+
+
+def _read_only_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Menandai seluruh buffer numpy di balik DataFrame sebagai non-writeable (tulis in-place akan error)."""
+    for col in frame.columns:
+        values = frame[col].array
+        for array in [getattr(values, "_ndarray", None), getattr(values, "codes", None)]:
+            if isinstance(array, np.ndarray) and array.flags.writeable:
+                array.flags.writeable = False
+        if isinstance(values, np.ndarray) and values.flags.writeable:
+            values.flags.writeable = False
+    return frame
+
+
+class SharedDataset:
+    """Dataset provinsi yang sudah diproses, read-only, dan dibagi antar sesi lewat st.cache_resource.
+
+    Data disimpan sekali sebagai tabel Arrow yang ringkas (provinsi sebagai dictionary/kategori,
+    hitungan int32 bila persis bulat, selain itu float64). DataFrame pandas dibuat dari tabel tersebut
+    dengan split_blocks sehingga kolom numerik memakai buffer Arrow yang sama (zero-copy), dan semua
+    buffernya non-writeable. `frame` dan `gender_top_long` mengembalikan salinan dangkal, jadi
+    menambah/mengganti kolom di satu sesi tidak mengubah data sesi lain.
+    """
+
+    def __init__(self, typed_rows: List[Dict[str, Any]], col_map: Dict[str, str] = COLUMN_MAP):
+        baseline = pd.DataFrame(typed_rows)
+        self.col_map = dict(col_map)
+        self.pencari_col = col_map.get("b1xjkdn0vw")
+        self.lowongan_col = col_map.get("yeloqirlpp")
+        self.penempatan_col = col_map.get("ytis9poht5")
+
+        columns: Dict[str, pa.Array] = {}
+        if "Provinsi" in baseline.columns:
+            columns["Provinsi"] = pa.array(baseline["Provinsi"].astype(str)).dictionary_encode()
+            columns["Provinsi_Clean"] = pa.array(clean_province_names(baseline["Provinsi"])).dictionary_encode()
+        for col_name in col_map.values():
+            if col_name in baseline.columns and col_name not in columns:
+                columns[col_name] = _compact_numeric_array(baseline[col_name].to_numpy(dtype=np.float64))
+
+        ratios = compute_ratio_columns(baseline, self.pencari_col, self.lowongan_col, self.penempatan_col)
+        self.ratios_valid = ratios is not None
+        for ratio_col in [RASIO_LP_COL, RASIO_PP_COL]:
+            ratio_values = ratios[ratio_col] if ratios else np.zeros(len(baseline))
+            columns[ratio_col] = pa.array(ratio_values.astype(np.float64))
+
+        self.table: pa.Table = pa.table(columns)
+        self._frame: pd.DataFrame = _read_only_frame(self.table.to_pandas(split_blocks=True, self_destruct=False))
+        self.numeric_columns = frozenset(col for col in self._frame.columns if pd.api.types.is_numeric_dtype(self._frame[col]))
+
+        # Ukuran representasi lama (object string + float64, ditambah kolom turunan) sebagai pembanding
+        baseline["Provinsi_Clean"] = clean_province_names(baseline["Provinsi"]) if "Provinsi" in baseline.columns else None
+        for ratio_col in [RASIO_LP_COL, RASIO_PP_COL]:
+            baseline[ratio_col] = ratios[ratio_col] if ratios else 0.0
+        self._baseline_bytes = int(baseline.memory_usage(deep=True, index=True).sum())
+
+        self._lock = threading.Lock()
+        self._gender_cache: Dict[Tuple[str, ...], Tuple[List[str], pd.DataFrame]] = {}
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Salinan dangkal DataFrame bersama (buffer data tetap dibagi, tanpa copy)."""
+        return self._frame.copy(deep=False)
+
+    def gender_top_long(self, lk_col: str, pr_col: str, jml_col: str, value_name: str, top_n: int = 10) -> Tuple[List[str], pd.DataFrame]:
+        """Top-N provinsi berdasarkan jml_col dalam format panjang (L/P), dihitung sekali lalu dibagi antar sesi."""
+        key = (lk_col, pr_col, jml_col, value_name, str(top_n))
+        with self._lock:
+            cached = self._gender_cache.get(key)
+        if cached is not None:
+            return list(cached[0]), cached[1].copy(deep=False)
+        top_provinces = self._frame.nlargest(top_n, jml_col)[["Provinsi", lk_col, pr_col]]
+        provinsi_order = top_provinces["Provinsi"].astype(str).tolist()
+        melted = top_provinces.assign(Provinsi=provinsi_order).melt(
+            id_vars=["Provinsi"], value_vars=[lk_col, pr_col], var_name="Jenis Kelamin", value_name=value_name)
+        with self._lock:
+            self._gender_cache.setdefault(key, (provinsi_order, _read_only_frame(melted)))
+        return list(provinsi_order), melted.copy(deep=False)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Ringkasan pemakaian memori: tabel Arrow bersama, DataFrame view-nya, dan pembanding representasi lama."""
+        frame_bytes = self._frame.memory_usage(deep=True, index=True)
+        per_column = [
+            {"kolom": field.name, "tipe_arrow": str(field.type), "tipe_pandas": str(self._frame[field.name].dtype),
+             "bytes_arrow": int(self.table.column(field.name).nbytes), "bytes_pandas": int(frame_bytes.get(field.name, 0))}
+            for field in self.table.schema
+        ]
+        with self._lock:
+            gender_bytes = sum(int(melted.memory_usage(deep=True).sum()) for _, melted in self._gender_cache.values())
+        arrow_bytes = int(self.table.nbytes)
+        pandas_bytes = int(frame_bytes.sum())
+        return {
+            "jumlah_baris": len(self),
+            "bytes_arrow": arrow_bytes,
+            "bytes_pandas_view": pandas_bytes,
+            "bytes_cache_gender": gender_bytes,
+            "bytes_representasi_lama": self._baseline_bytes,
+            "rasio_penghematan": round(1 - arrow_bytes / self._baseline_bytes, 4) if self._baseline_bytes else 0.0,
+            "per_kolom": per_column,
+        }
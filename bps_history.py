@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+from copy import deepcopy
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+from pymongo import ASCENDING, DESCENDING, errors as pymongo_errors
+
+# --- Konstanta Riwayat Snapshot ---
+# Setiap versi hanya menyimpan sel (item provinsi x id_var) yang berubah dibanding versi sebelumnya.
+# Tiap HISTORY_CHECKPOINT_INTERVAL versi disimpan satu checkpoint penuh agar rekonstruksi
+# tidak perlu memutar ulang seluruh riwayat dari versi pertama.
+HISTORY_CHECKPOINT_INTERVAL = 20
+ITEM_META_KEY = "__item__" # id_var semu untuk field item provinsi selain 'variables' (label, kode, dst.)
+ITEM_RAW_KEY = "__raw__" # id_var semu untuk item yang bukan dict (disimpan apa adanya)
+ORDER_CELL = ("", "__urutan__") # sel tingkat dokumen berisi urutan kunci item, agar urutan 'data_provinsi' ikut dibangun ulang
+
+# (kunci item, id_var). Kunci item stabil per provinsi (label atau kode + kemunculan ke-n), sehingga
+# provinsi yang disisipkan/dihapus/dipindah tidak menggeser sel provinsi lain.
+CellKey = Tuple[str, str]
+
+
+def compute_content_hash(value: Any) -> str:
+    """Menghitung hash SHA-256 dari representasi JSON kanonik sebuah nilai."""
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def item_keys(data_provinsi: List[Any]) -> List[str]:
+    """Kunci stabil tiap item: (label atau kode, kemunculan ke-n label tsb.); posisi hanya untuk item tanpa label/kode."""
+    keys, seen = [], {}
+    for posisi, item_prov in enumerate(data_provinsi or []):
+        identity = None
+        if isinstance(item_prov, dict):
+            for field in ["label", "kode"]:
+                if item_prov.get(field) not in (None, ""):
+                    identity = [field, item_prov[field]]
+                    break
+        if identity is None:
+            keys.append(json.dumps(["posisi", posisi]))
+            continue
+        identity_json = json.dumps(identity, sort_keys=True, ensure_ascii=False, default=str)
+        seen[identity_json] = seen.get(identity_json, -1) + 1
+        keys.append(json.dumps(identity + [seen[identity_json]], sort_keys=True, ensure_ascii=False, default=str))
+    return keys
+
+
+def flatten_cells(data_provinsi: List[Dict[str, Any]]) -> Dict[CellKey, Any]:
+    """Memecah list 'data_provinsi' menjadi sel (kunci item, id_var) plus satu sel urutan item."""
+    keys = item_keys(data_provinsi)
+    cells: Dict[CellKey, Any] = {ORDER_CELL: keys}
+    for key, item_prov in zip(keys, data_provinsi or []):
+        if not isinstance(item_prov, dict):
+            cells[(key, ITEM_RAW_KEY)] = item_prov
+            continue
+        # Field selain isi 'variables' (label, kode, dst.) disimpan sebagai satu sel meta agar item bisa dibangun ulang utuh
+        # (isi 'variables' dipecah per id_var hanya jika berupa dict; bentuk lain disimpan apa adanya di sel meta)
+        variables = item_prov.get("variables")
+        cells[(key, ITEM_META_KEY)] = {field: ({} if field == "variables" and isinstance(variables, dict) else value) for field, value in item_prov.items()}
+        if isinstance(variables, dict):
+            for id_var, raw_val_obj in variables.items():
+                cells[(key, id_var)] = raw_val_obj
+    return cells
+
+
+def unflatten_cells(cells: Dict[CellKey, Any]) -> List[Any]:
+    """Kebalikan dari flatten_cells: membangun ulang list 'data_provinsi' sesuai sel urutan item."""
+    items: Dict[str, Any] = {}
+    for (key, id_var), value in cells.items():
+        if id_var in (ITEM_META_KEY, ITEM_RAW_KEY):
+            items[key] = deepcopy(value)
+    for (key, id_var), value in cells.items():
+        if (key, id_var) != ORDER_CELL and id_var not in (ITEM_META_KEY, ITEM_RAW_KEY) and isinstance(items.get(key), dict):
+            items[key].setdefault("variables", {})[id_var] = deepcopy(value)
+    return [items[key] for key in cells.get(ORDER_CELL, []) if key in items]
+
+
+def compute_cell_deltas(prev_cells: Dict[CellKey, Any], new_cells: Dict[CellKey, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """Membandingkan dua kumpulan sel, mengembalikan (sel berubah/baru, sel terhapus)."""
+    changed = [
+        {"item": key, "id_var": id_var, "value": value}
+        for (key, id_var), value in new_cells.items()
+        if (key, id_var) not in prev_cells or prev_cells[(key, id_var)] != value
+    ]
+    removed = [
+        {"item": key, "id_var": id_var}
+        for (key, id_var) in prev_cells
+        if (key, id_var) not in new_cells
+    ]
+    return changed, removed
+
+
+def ensure_history_indexes(history_collection: Any) -> None:
+    """Membuat index yang dibutuhkan koleksi riwayat (idempoten)."""
+    history_collection.create_index(
+        [("bps_id_tabel", ASCENDING), ("bps_tahun_data_request", ASCENDING), ("versi", DESCENDING)],
+        unique=True, name="tabel_tahun_versi"
+    )
+    history_collection.create_index(
+        [("bps_id_tabel", ASCENDING), ("bps_tahun_data_request", ASCENDING), ("content_hash", ASCENDING)],
+        name="tabel_tahun_content_hash"
+    )
+
+
+def _replay_history(history_collection: Any, id_tabel: str, tahun_data_req: str, versi: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Memutar ulang delta dari checkpoint terdekat hingga versi yang diminta (default: versi terbaru)."""
+    base_filter: Dict[str, Any] = {"bps_id_tabel": id_tabel, "bps_tahun_data_request": tahun_data_req}
+    upper_filter = dict(base_filter)
+    if versi is not None:
+        upper_filter["versi"] = {"$lte": versi}
+
+    checkpoint = history_collection.find_one({**upper_filter, "is_checkpoint": True}, sort=[("versi", DESCENDING)])
+    if not checkpoint:
+        return None
+
+    replay_filter = {**base_filter, "versi": {"$gte": checkpoint["versi"]}}
+    if versi is not None:
+        replay_filter["versi"]["$lte"] = versi
+
+    cells: Dict[CellKey, Any] = {}
+    state: Dict[str, Any] = {}
+    for version_doc in history_collection.find(replay_filter, sort=[("versi", ASCENDING)]):
+        for cell in version_doc.get("cells_removed", []):
+            cells.pop((cell["item"], cell["id_var"]), None)
+        for cell in version_doc.get("cells_changed", []):
+            cells[(cell["item"], cell["id_var"])] = cell.get("value")
+        if "metadata_tabel_scraped" in version_doc:
+            state["metadata_tabel_scraped"] = version_doc["metadata_tabel_scraped"]
+        for key in ["versi", "content_hash", "metadata_hash", "timestamp_scraped_utc", "bps_tahun_data_actual"]:
+            state[key] = version_doc.get(key)
+
+    if versi is not None and state.get("versi") != versi:
+        return None
+    state["cells"] = cells
+    return state
+
+
+def store_history_version(history_collection: Any, data_provinsi: List[Dict[str, Any]], metadata_tabel_scraped: Dict[str, Any],
+                          id_tabel: str, tahun_data_req: str, tahun_data_actual: Any, timestamp_utc: datetime) -> Optional[int]:
+    """Menambahkan versi baru (hanya delta sel) ke koleksi riwayat jika isi data berubah.
+
+    Mengembalikan nomor versi yang baru disimpan, atau None jika isi data sama dengan versi terakhir.
+    """
+    ensure_history_indexes(history_collection)
+
+    content_hash = compute_content_hash(data_provinsi)
+    metadata_hash = compute_content_hash(metadata_tabel_scraped)
+    previous = _replay_history(history_collection, id_tabel, tahun_data_req)
+
+    if previous and previous.get("content_hash") == content_hash and previous.get("metadata_hash") == metadata_hash:
+        logging.info(f"ℹ️ Isi data identik dengan versi riwayat {previous['versi']} (hash: {content_hash[:12]}), tidak ada versi baru.")
+        return None
+
+    new_cells = flatten_cells(data_provinsi)
+    versi = (previous["versi"] + 1) if previous else 1
+    is_checkpoint = previous is None or (versi - 1) % HISTORY_CHECKPOINT_INTERVAL == 0
+
+    if is_checkpoint:
+        cells_changed, cells_removed = compute_cell_deltas({}, new_cells)
+    else:
+        cells_changed, cells_removed = compute_cell_deltas(previous["cells"], new_cells)
+
+    version_doc: Dict[str, Any] = {
+        "bps_id_tabel": id_tabel,
+        "bps_tahun_data_request": tahun_data_req,
+        "bps_tahun_data_actual": tahun_data_actual,
+        "versi": versi,
+        "content_hash": content_hash,
+        "parent_hash": previous.get("content_hash") if previous else None,
+        "metadata_hash": metadata_hash,
+        "timestamp_scraped_utc": timestamp_utc,
+        "is_checkpoint": is_checkpoint,
+        "cells_changed": cells_changed,
+        "cells_removed": cells_removed,
+    }
+    # Metadata tabel hanya disimpan jika berubah (atau di checkpoint)
+    if is_checkpoint or previous.get("metadata_hash") != metadata_hash:
+        version_doc["metadata_tabel_scraped"] = metadata_tabel_scraped
+
+    try:
+        history_collection.insert_one(version_doc)
+    except pymongo_errors.DuplicateKeyError:
+        logging.warning(f"⚠️ Versi riwayat {versi} sudah ada (kemungkinan scraper berjalan paralel), versi ini dilewati.")
+        return None
+
+    logging.info(f"✅ Versi riwayat {versi} disimpan ({'checkpoint, ' if is_checkpoint else ''}{len(cells_changed)} sel berubah, {len(cells_removed)} sel terhapus, hash: {content_hash[:12]}).")
+    return versi
+
+
+def list_history_versions(history_collection: Any, id_tabel: str, tahun_data_req: str) -> List[Dict[str, Any]]:
+    """Mengambil daftar versi riwayat (tanpa isi delta), terbaru lebih dulu."""
+    projection = {"_id": 0, "versi": 1, "content_hash": 1, "timestamp_scraped_utc": 1, "is_checkpoint": 1, "bps_tahun_data_actual": 1}
+    cursor = history_collection.find({"bps_id_tabel": id_tabel, "bps_tahun_data_request": tahun_data_req}, projection, sort=[("versi", DESCENDING)])
+    return list(cursor)
+
+
+def rebuild_snapshot(history_collection: Any, id_tabel: str, tahun_data_req: str, versi: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Membangun ulang snapshot (data_provinsi + metadata) pada versi tertentu dari delta riwayat.
+
+    Jika versi tidak diberikan, snapshot versi terbaru yang dibangun ulang. Mengembalikan None jika versi
+    tidak ada atau hash hasil rekonstruksi tidak sama dengan content_hash yang tersimpan.
+    """
+    state = _replay_history(history_collection, id_tabel, tahun_data_req, versi)
+    if not state:
+        logging.warning(f"Versi riwayat {versi if versi is not None else 'terbaru'} tidak ditemukan untuk ID Tabel {id_tabel}, Tahun {tahun_data_req}.")
+        return None
+
+    data_provinsi = unflatten_cells(state["cells"])
+    if compute_content_hash(data_provinsi) != state.get("content_hash"):
+        # Jangan kembalikan snapshot yang tidak identik dengan yang dulu di-scrape
+        logging.error(f"❌ Hash snapshot hasil rekonstruksi versi {state.get('versi')} tidak cocok dengan hash tersimpan, snapshot tidak dikembalikan.")
+        return None
+
+    return {
+        "versi": state.get("versi"),
+        "content_hash": state.get("content_hash"),
+        "timestamp_scraped_utc": state.get("timestamp_scraped_utc"),
+        "bps_id_tabel": id_tabel,
+        "bps_tahun_data_request": tahun_data_req,
+        "bps_tahun_data_actual": state.get("bps_tahun_data_actual"),
+        "metadata_tabel_scraped": state.get("metadata_tabel_scraped", {}),
+        "data_provinsi": data_provinsi,
+    }
@@ -0,0 +1,151 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Any
+
+import requests
+from pymongo import MongoClient
+
+# --- Konstanta Loader Latar Belakang ---
+# Interval refresh sengaja lebih pendek dari TTL cache lama di app.py (900 dtk & 86400 dtk),
+# sehingga data sudah diperbarui sebelum dianggap kedaluwarsa dan tidak ada sesi yang menunggu.
+DOCUMENT_REFRESH_SECONDS = 600
+GEOJSON_REFRESH_SECONDS = 43200
+# Setelah gagal, coba lagi lebih cepat dengan backoff eksponensial (5, 10, 20, ... dtk) hingga berhasil
+RETRY_INITIAL_SECONDS = 5
+MONGO_TIMEOUT_MS = 10000
+GEOJSON_TIMEOUT_SECONDS = 20
+
+
+def create_mongo_client(mongo_uri: str) -> MongoClient:
+    """Membuat MongoClient tanpa ping; koneksi dibuka (dan divalidasi) oleh query pertama."""
+    return MongoClient(mongo_uri, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS, connectTimeoutMS=MONGO_TIMEOUT_MS)
+
+
+def fetch_latest_document(collection: Any, id_tabel: str, tahun_data_req: str) -> Optional[Dict[str, Any]]:
+    """Mengambil dokumen snapshot terbaru untuk ID Tabel & tahun request."""
+    query_filter = {"bps_id_tabel": id_tabel, "bps_tahun_data_request": tahun_data_req}
+    latest_document = collection.find_one(query_filter)
+    if latest_document:
+        logging.info(f"Data terbaru diambil dari DB (filter: {query_filter}), ts scrape: {latest_document.get('timestamp_scraped_utc')}")
+    else:
+        logging.warning(f"Tidak ada dokumen ditemukan di MongoDB dengan filter: {query_filter}.")
+    return latest_document
+
+
+def fetch_geojson(url: str) -> Optional[Dict[str, Any]]:
+    """Mengunduh GeoJSON batas provinsi; None jika formatnya tidak sesuai."""
+    response = requests.get(url, timeout=GEOJSON_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    geojson = response.json()
+    if isinstance(geojson, dict) and geojson.get("type") in ["FeatureCollection", "Feature"]:
+        return geojson
+    logging.warning(f"Format GeoJSON tidak sesuai dari URL: {url}")
+    return None
+
+
+class BackgroundLoader:
+    """Memuat dokumen MongoDB & GeoJSON di thread latar belakang dan menyegarkannya sebelum kedaluwarsa.
+
+    Satu instance dibagi oleh semua sesi (lewat st.cache_resource). Sesi hanya membaca snapshot()
+    yang selalu mengembalikan nilai terakhir yang berhasil dimuat, sehingga selama refresh
+    pengguna melihat data lama (stale) alih-alih menunggu. Dokumen dan GeoJSON dimuat di thread
+    terpisah: loader sudah "ready" begitu dokumen selesai dimuat, GeoJSON (hanya untuk tab peta) menyusul.
+    """
+
+    def __init__(self, mongo_uri: str, database_name: str, collection_name: str, id_tabel: str, tahun_data_req: str,
+                 geojson_url: Optional[str] = None, client: Optional[MongoClient] = None):
+        self.mongo_uri = mongo_uri
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.id_tabel = id_tabel
+        self.tahun_data_req = tahun_data_req
+        self.geojson_url = geojson_url
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._client: Optional[MongoClient] = client # Bisa dibagi antar loader (mis. di api.py)
+        self._state: Dict[str, Any] = {
+            "client": None, "latest_doc": None, "geojson": None,
+            "doc_loaded_at": None, "geojson_loaded_at": None, "errors": {},
+        }
+
+    def start(self) -> "BackgroundLoader":
+        """Menjalankan thread loader dokumen (dan GeoJSON jika ada URL-nya). Idempoten."""
+        with self._lock:
+            if not any(thread.is_alive() for thread in self._threads):
+                self._stop.clear()
+                targets = [(self._load_document, DOCUMENT_REFRESH_SECONDS, True, "doc")]
+                if self.geojson_url:
+                    targets.append((self._load_geojson, GEOJSON_REFRESH_SECONDS, False, "geojson"))
+                self._threads = [
+                    threading.Thread(target=self._run, args=(load, refresh_seconds, sets_ready), name=f"bps-loader-{name}-{self.collection_name}", daemon=True)
+                    for load, refresh_seconds, sets_ready, name in targets
+                ]
+                for thread in self._threads:
+                    thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Menghentikan thread loader pada kesempatan berikutnya (tidak menutup client bersama)."""
+        self._stop.set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Menunggu hingga percobaan muat dokumen pertama selesai (berhasil atau gagal)."""
+        return self._ready.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Salinan dangkal state terakhir: client, latest_doc, geojson, waktu muat, dan error per sumber."""
+        with self._lock:
+            state = dict(self._state)
+            state["errors"] = dict(self._state["errors"])
+        state["ready"] = self._ready.is_set()
+        return state
+
+    def _set(self, source: str, error: Optional[str], **values: Any) -> None:
+        with self._lock:
+            self._state.update(values)
+            if error:
+                self._state["errors"][source] = error
+            else:
+                self._state["errors"].pop(source, None)
+
+    def _load_document(self) -> bool:
+        try:
+            if self._client is None:
+                self._client = create_mongo_client(self.mongo_uri)
+            collection = self._client[self.database_name][self.collection_name]
+            latest_doc = fetch_latest_document(collection, self.id_tabel, self.tahun_data_req)
+            self._set("mongo", None, client=self._client, latest_doc=latest_doc, doc_loaded_at=datetime.now(timezone.utc))
+            return True
+        except Exception as e:
+            logging.error(f"Error loader latar belakang (MongoDB): {e}", exc_info=True)
+            self._set("mongo", str(e))
+            return False
+
+    def _load_geojson(self) -> bool:
+        try:
+            geojson = fetch_geojson(self.geojson_url)
+            if geojson is None:
+                self._set("geojson", f"Format GeoJSON tidak sesuai dari URL: {self.geojson_url}")
+                return False
+            self._set("geojson", None, geojson=geojson, geojson_loaded_at=datetime.now(timezone.utc))
+            return True
+        except Exception as e:
+            logging.error(f"Error loader latar belakang (GeoJSON dari {self.geojson_url}): {e}", exc_info=True)
+            self._set("geojson", str(e))
+            return False
+
+    def _run(self, load: Callable[[], bool], refresh_seconds: int, sets_ready: bool) -> None:
+        retry_seconds = RETRY_INITIAL_SECONDS
+        while not self._stop.is_set():
+            success = load()
+            if sets_ready:
+                self._ready.set()
+            if success:
+                delay, retry_seconds = refresh_seconds, RETRY_INITIAL_SECONDS
+            else:
+                delay, retry_seconds = min(retry_seconds, refresh_seconds), retry_seconds * 2
+            self._stop.wait(delay)
@@ -0,0 +1,124 @@
+from typing import Dict, List, Optional, Any, Tuple
+
+# Versi skema tahap validasi/koersi. Naikkan jika COLUMN_MAP atau format 'data_provinsi_typed' berubah,
+# agar dashboard tahu dokumen lama perlu divalidasi ulang.
+SCHEMA_STAGE_VERSION = "1"
+
+# !! PENTING SEKALI: VERIFIKASI KUNCI ('id_var') DI BAWAH INI !!
+# Bandingkan dengan laporan 'validasi_skema' yang disimpan scraper di dokumen MongoDB
+# (ditampilkan di sidebar dashboard). Kunci ('id_var') di COLUMN_MAP ini HARUS SAMA PERSIS dengan id_var dari API.
+COLUMN_MAP: Dict[str, str] = {
+    "iihviv2ocw": "Pencari Kerja Terdaftar - Laki-Laki",
+    "ijuxru3lvl": "Pencari Kerja Terdaftar - Perempuan",
+    "b1xjkdn0vw": "Pencari Kerja Terdaftar - Jumlah",
+    "kgpd8jp9bs": "Lowongan Kerja Terdaftar - Laki-Laki",
+    "b4ox1vczyq": "Lowongan Kerja Terdaftar - Perempuan",
+    "yeloqirlpp": "Lowongan Kerja Terdaftar - Jumlah",
+    "2ikzujodce": "Penempatan Tenaga Kerja - Laki-Laki",
+    "lfbbv5gdz2": "Penempatan Tenaga Kerja - Perempuan",
+    "ytis9poht5": "Penempatan Tenaga Kerja - Jumlah",
+    "ksybbjfehm": "Pencari Kerja Terdaftar - Laki-Laki atau Perempuan" # Verifikasi id_var ini!
+}
+
+STATUS_DITEMUKAN = "✅ DITEMUKAN"
+STATUS_TIDAK_DI_API = "❌ TIDAK DITEMUKAN DI API"
+STATUS_TIDAK_DI_DATA = "❌ TIDAK DITEMUKAN DI DATA PROVINSI"
+
+
+def parse_bps_value(raw_value_object: Any) -> float:
+    """Mengubah nilai mentah BPS (dict/str/angka berformat Indonesia) menjadi float."""
+    raw_value_string = "0"
+    if isinstance(raw_value_object, dict):
+        possible_keys = ["value_raw", "val", "nilai"]
+        for key in possible_keys:
+            if key in raw_value_object and raw_value_object[key] is not None:
+                raw_value_string = str(raw_value_object[key]); break
+        else:
+            if len(raw_value_object) == 1 and list(raw_value_object.values())[0] is not None:
+                 raw_value_string = str(list(raw_value_object.values())[0])
+    elif isinstance(raw_value_object, (str, int, float)) and raw_value_object is not None:
+        raw_value_string = str(raw_value_object)
+    cleaned_value_string = raw_value_string.replace(".", "").replace(",", ".")
+    try: return float(cleaned_value_string)
+    except ValueError: return 0.0
+
+
+def resolve_column_names(kolom: Optional[Dict[str, Any]], col_map: Dict[str, str]) -> List[Dict[str, str]]:
+    """Mencocokkan id_var di col_map dengan definisi 'kolom' dari API BPS."""
+    resolved = []
+    for id_var, col_name in col_map.items():
+        api_def = kolom.get(id_var) if isinstance(kolom, dict) else None
+        resolved.append({
+            "id_var": id_var,
+            "nama_kolom": col_name,
+            "status": STATUS_DITEMUKAN if api_def is not None else STATUS_TIDAK_DI_API,
+            "nama_variabel_api": api_def.get("nama_variabel", "Nama variabel tidak ada di API def") if isinstance(api_def, dict) else "N/A",
+        })
+    return resolved
+
+
+def coerce_provinsi_rows(data_provinsi: List[Dict[str, Any]], col_map: Dict[str, str]) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Mengubah 'data_provinsi' mentah menjadi baris bertipe (float) per provinsi, tanpa baris agregat INDONESIA."""
+    rows, missing_keys = [], {}
+    for idx, item_prov in enumerate(data_provinsi):
+        if not isinstance(item_prov, dict): continue
+        label_prov = str(item_prov.get("label") or f"Prov Unknown #{idx}")
+        if label_prov.strip().upper() == "INDONESIA": continue
+        row_data: Dict[str, Any] = {"Provinsi": label_prov}
+        vars_prov = item_prov.get("variables")
+        if not isinstance(vars_prov, dict): vars_prov = {}
+        for api_id, col_name in col_map.items():
+            raw_val_obj = vars_prov.get(api_id)
+            if raw_val_obj is None:
+                row_data[col_name] = 0.0
+                missing_keys.setdefault(api_id, {"col_name": col_name, "miss_count": 0})["miss_count"] += 1
+            else:
+                row_data[col_name] = parse_bps_value(raw_val_obj)
+        rows.append(row_data)
+    return rows, missing_keys
+
+
+def apply_schema(data_provinsi: List[Dict[str, Any]], metadata_tabel: Optional[Dict[str, Any]], col_map: Dict[str, str] = COLUMN_MAP) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Tahap skema saat ingest: resolve id_var -> nama kolom, koersi ke float, dan susun laporan validasi.
+
+    Mengembalikan (baris bertipe, laporan validasi). Keduanya disimpan scraper di dokumen MongoDB
+    sehingga dashboard tidak perlu mengulang validasi di setiap rerun.
+    """
+    kolom = metadata_tabel.get("kolom") if isinstance(metadata_tabel, dict) else None
+    kolom_tersedia = isinstance(kolom, dict)
+    rows, missing_keys = coerce_provinsi_rows(data_provinsi, col_map)
+
+    status_pemetaan = resolve_column_names(kolom if kolom_tersedia else None, col_map)
+    for entry in status_pemetaan:
+        # Fallback jika definisi 'kolom' tidak ada tapi id_var juga tidak muncul di data provinsi
+        if entry["status"] != STATUS_DITEMUKAN and not kolom_tersedia and missing_keys.get(entry["id_var"]):
+            entry["status"] = STATUS_TIDAK_DI_DATA
+
+    id_var_tidak_di_kolom = [entry["id_var"] for entry in status_pemetaan if entry["status"] != STATUS_DITEMUKAN] if kolom_tersedia else []
+    report = {
+        "schema_stage_version": SCHEMA_STAGE_VERSION,
+        "column_map": dict(col_map),
+        "kolom_tersedia": kolom_tersedia,
+        "status_pemetaan": status_pemetaan,
+        "id_var_tidak_ditemukan_di_data": missing_keys,
+        "id_var_tidak_ada_di_kolom_api": id_var_tidak_di_kolom,
+        "kolom_api_tidak_dipetakan": sorted(id_var for id_var in kolom if id_var not in col_map) if kolom_tersedia else [],
+        "jumlah_provinsi": len(rows),
+        "valid": kolom_tersedia and not missing_keys and not id_var_tidak_di_kolom and bool(rows),
+    }
+    return rows, report
+
+
+def schema_error_report(error: Exception, col_map: Dict[str, str] = COLUMN_MAP) -> Dict[str, Any]:
+    """Laporan validasi untuk tahap skema yang gagal; data mentah tetap disimpan dan dashboard memvalidasi ulang."""
+    return {
+        "schema_stage_version": SCHEMA_STAGE_VERSION,
+        "column_map": dict(col_map),
+        "valid": False,
+        "error": f"{type(error).__name__}: {error}",
+    }
+
+
+def is_schema_report_current(report: Any, col_map: Dict[str, str] = COLUMN_MAP) -> bool:
+    """True jika laporan skema di dokumen dibuat dengan versi tahap & COLUMN_MAP yang sama dengan kode saat ini."""
+    return isinstance(report, dict) and "error" not in report and report.get("schema_stage_version") == SCHEMA_STAGE_VERSION and report.get("column_map") == col_map
@@ -7,6 +7,8 @@ import json
 import time
 import logging
 from typing import Dict, List, Optional, Any, Tuple # Pastikan baris ini ada
+from bps_history import compute_content_hash, store_history_version
+from bps_schema import apply_schema, schema_error_report
 
 # --- Konfigurasi Logging ---
 logging.basicConfig(
@@ -31,6 +33,8 @@ DATABASE_NAME = os.getenv("MONGO_DATABASE_NAME", "bps_db")
 TARGET_BPS_ID_TABEL = "TE9UUDFUV3Bpa3ovMHJJVGtuUHZVdz09"
 TARGET_BPS_TAHUN = "2024"
 COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", f"data_bps_{TARGET_BPS_ID_TABEL.replace('=', '').replace('/', '')}_{TARGET_BPS_TAHUN}")
+# Koleksi append-only berisi delta per sel antar scrape (lihat bps_history.py)
+HISTORY_COLLECTION_NAME = os.getenv("MONGO_HISTORY_COLLECTION_NAME", f"{COLLECTION_NAME}_history")
 
 
 # --- Konfigurasi API BPS (berdasarkan URL terakhir yang Anda berikan) ---
@@ -111,7 +115,7 @@ def fetch_bps_data(api_url: str) -> Optional[dict]:
             logging.error(f"❌ Gagal mengambil data dari API BPS setelah {MAX_RETRIES} percobaan.")
     return None
 
-def process_and_store_data(collection: Any, json_data: dict, api_url: str, id_tabel: str, tahun_data_req: str) -> bool:
+def process_and_store_data(collection: Any, json_data: dict, api_url: str, id_tabel: str, tahun_data_req: str, history_collection: Optional[Any] = None) -> bool:
     """Memproses data JSON dari BPS dan menyimpannya ke MongoDB."""
     try:
         # Validasi Awal: json_data harus dictionary dan memiliki field 'data' berupa list
@@ -172,6 +176,18 @@ def process_and_store_data(collection: Any, json_data: dict, api_url: str, id_ta
         # Pastikan tahun_data ada, jika tidak ambil dari tahun request
         actual_tahun_data = metadata_tabel_scraped.get("tahun_data", tahun_data_req)
 
+        # Tahap skema: resolve id_var -> nama kolom & koersi ke float sekali di sini, bukan di setiap rerun dashboard.
+        # Kegagalan tahap ini tidak boleh membatalkan penyimpanan snapshot mentah.
+        try:
+            data_provinsi_typed, validasi_skema = apply_schema(provinsi_data_list, metadata_tabel_scraped)
+            if validasi_skema["valid"]:
+                logging.info(f"✅ Validasi skema lolos: {validasi_skema['jumlah_provinsi']} provinsi, {len(validasi_skema['column_map'])} kolom.")
+            else:
+                logging.warning(f"⚠️ Validasi skema tidak lolos. id_var tidak ada di data: {list(validasi_skema['id_var_tidak_ditemukan_di_data'])}; "
+                                f"id_var tidak ada di 'kolom' API: {validasi_skema['id_var_tidak_ada_di_kolom_api']}. Periksa COLUMN_MAP di bps_schema.py.")
+        except Exception as e:
+            logging.error(f"❌ Tahap skema gagal, snapshot mentah tetap disimpan tanpa data bertipe: {e}", exc_info=True)
+            data_provinsi_typed, validasi_skema = None, schema_error_report(e)
 
         document_to_insert = {
             "timestamp_scraped_utc": timestamp_utc,
@@ -184,7 +200,10 @@ def process_and_store_data(collection: Any, json_data: dict, api_url: str, id_ta
             "bps_data_source_id_used": BPS_DATA_SOURCE_ID,
             "metadata_tabel_scraped": metadata_tabel_scraped, # Termasuk definisi 'kolom'
             "data_provinsi": provinsi_data_list,
-            "schema_version": "1.2" # Update versi skema jika ada perubahan signifikan
+            "content_hash": compute_content_hash(provinsi_data_list), # Sama dengan content_hash versi riwayat yang isinya identik
+            "data_provinsi_typed": data_provinsi_typed, # Baris bertipe float per provinsi (hasil tahap skema)
+            "validasi_skema": validasi_skema, # Laporan validasi COLUMN_MAP vs 'kolom' API
+            "schema_version": "1.3" # Update versi skema jika ada perubahan signifikan
         }
 
         # Menggunakan Upsert: Update jika ada berdasarkan ID Tabel & Tahun request, Insert jika belum ada.
@@ -200,6 +219,15 @@ def process_and_store_data(collection: Any, json_data: dict, api_url: str, id_ta
             logging.info(f"✅ Data yang ada berhasil di-update di MongoDB (filter: {query_filter}).")
         else:
             logging.info(f"ℹ️ Tidak ada perubahan data di MongoDB (filter: {query_filter}). Data mungkin sama atau list provinsi kosong.")
+
+        # Simpan delta ke koleksi riwayat agar revisi angka lama dari BPS tidak hilang tertimpa upsert.
+        # Kegagalan di sini tidak membatalkan snapshot terbaru yang sudah tersimpan.
+        if history_collection is not None:
+            try:
+                store_history_version(history_collection, provinsi_data_list, metadata_tabel_scraped,
+                                      id_tabel, tahun_data_req, actual_tahun_data, timestamp_utc)
+            except pymongo_errors.PyMongoError as e:
+                logging.error(f"❌ Error MongoDB saat menyimpan riwayat snapshot: {e}")
         return True
 
     except (KeyError, IndexError, TypeError) as e:
@@ -241,7 +269,8 @@ def main():
     json_data = fetch_bps_data(api_url)
 
     if json_data:
-        if process_and_store_data(collection, json_data, api_url, TARGET_BPS_ID_TABEL, TARGET_BPS_TAHUN):
+        history_collection = collection.database[HISTORY_COLLECTION_NAME]
+        if process_and_store_data(collection, json_data, api_url, TARGET_BPS_ID_TABEL, TARGET_BPS_TAHUN, history_collection):
             logging.info("🎉 Scraper berhasil menyelesaikan tugas.")
         else:
             logging.error("❌ Scraper gagal memproses atau menyimpan data setelah data API diterima.")
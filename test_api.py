@@ -0,0 +1,95 @@
+import io
+from datetime import datetime, timezone
+
+import mongomock
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from bps_schema import apply_schema
+
+ID_TABEL, TAHUN = api.BPS_ID_TABEL_TARGET, api.BPS_TAHUN_TARGET
+
+DATA_PROVINSI = [
+    {"label": "ACEH", "variables": {"b1xjkdn0vw": {"value_raw": "1.000"}, "yeloqirlpp": {"value_raw": "250"}, "ytis9poht5": {"value_raw": "100"}}},
+    {"label": "DKI JAKARTA", "variables": {"b1xjkdn0vw": {"value_raw": "3.000"}, "yeloqirlpp": {"value_raw": "1.500"}, "ytis9poht5": {"value_raw": "600"}}},
+    {"label": "JAWA BARAT", "variables": {"b1xjkdn0vw": {"value_raw": "123456,7"}, "yeloqirlpp": {"value_raw": "0"}, "ytis9poht5": {"value_raw": "0"}}},
+    {"label": "INDONESIA", "variables": {"b1xjkdn0vw": {"value_raw": "127.456,7"}}},
+]
+
+
+@pytest.fixture
+def mongo_client(monkeypatch):
+    client = mongomock.MongoClient()
+    typed_rows, validasi_skema = apply_schema(DATA_PROVINSI, None)
+    client[api.MONGO_DATABASE_NAME][api.collection_name_for(ID_TABEL, TAHUN)].insert_one({
+        "bps_id_tabel": ID_TABEL, "bps_tahun_data_request": TAHUN, "bps_tahun_data_actual": TAHUN,
+        "timestamp_scraped_utc": datetime(2024, 5, 1, tzinfo=timezone.utc),
+        "data_provinsi": DATA_PROVINSI, "data_provinsi_typed": typed_rows, "validasi_skema": validasi_skema,
+    })
+    created = []
+    monkeypatch.setattr(api, "MONGO_URI", "mongodb://uji")
+    monkeypatch.setattr(api, "create_mongo_client", lambda uri: created.append(uri) or client)
+    for registry in [api._loaders, api._datasets, api._responses]:
+        registry.clear()
+    api._mongo_client = None
+    client.created = created
+    yield client
+    for loader in list(api._loaders.values()):
+        loader.stop()
+    api._loaders.clear()
+    api._mongo_client = None
+
+
+@pytest.fixture
+def http(mongo_client):
+    with TestClient(api.app) as test_client:
+        yield test_client
+
+
+def test_data_filters_and_formats(http):
+    response = http.get("/v1/data", params={"provinsi": "aceh,Jakarta", "columns": "Pencari Kerja Terdaftar - Jumlah"})
+    assert response.status_code == 200
+    rows = response.json()["data"]
+    assert rows == [{"Provinsi": "ACEH", "Pencari Kerja Terdaftar - Jumlah": 1000}, {"Provinsi": "DKI JAKARTA", "Pencari Kerja Terdaftar - Jumlah": 3000}]
+
+    jawa_barat = http.get("/v1/data", params={"provinsi": "JAWA BARAT"}).json()["data"][0]
+    assert jawa_barat["Pencari Kerja Terdaftar - Jumlah"] == 123456.7 # float64, tanpa ekor presisi float32
+
+    csv_text = http.get("/v1/data", params={"provinsi": "JAWA BARAT", "columns": "Pencari Kerja Terdaftar - Jumlah", "format": "csv"}).text
+    assert csv_text.splitlines() == ["Provinsi,Pencari Kerja Terdaftar - Jumlah", "JAWA BARAT,123456.7"]
+
+    arrow_response = http.get("/v1/data", params={"format": "arrow"})
+    assert arrow_response.headers["content-type"] == api.MEDIA_TYPES["arrow"]
+    table = pa.ipc.open_stream(io.BytesIO(arrow_response.content)).read_all()
+    assert table.num_rows == 3 and "Provinsi_Clean" not in table.column_names
+
+    unknown = http.get("/v1/data", params={"columns": "Kolom Fiktif"})
+    assert unknown.status_code == 400
+    assert unknown.json()["detail"]["kolom_tidak_dikenal"] == ["Kolom Fiktif"]
+
+
+def test_etag_returns_304(http):
+    first = http.get("/v1/data", params={"provinsi": "ACEH"})
+    etag = first.headers["etag"]
+    second = http.get("/v1/data", params={"provinsi": "ACEH"}, headers={"If-None-Match": etag})
+    assert second.status_code == 304 and second.content == b""
+    weak = http.get("/v1/data", params={"provinsi": "ACEH"}, headers={"If-None-Match": f'"lain", W/{etag}'})
+    assert weak.status_code == 304
+    assert http.get("/v1/data", params={"provinsi": "JAWA BARAT"}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_totals_are_exact(http):
+    totals = http.get("/v1/totals").json()["totals"]
+    assert totals["Pencari Kerja Terdaftar - Jumlah"] == 127456.7
+    assert totals["Lowongan Kerja Terdaftar - Jumlah"] == 1750
+    assert totals[api.RASIO_LP_COL] == round(1750 / 127456.7, 4)
+
+
+def test_unknown_pairs_are_evicted_and_share_one_client(http, mongo_client):
+    for tahun in range(2000, 2000 + api.MAX_LOADERS + 4):
+        assert http.get("/v1/data", params={"tahun": str(tahun)}).status_code == 404
+    assert list(api._loaders) == [(ID_TABEL, TAHUN)]
+    assert http.get("/v1/totals").status_code == 200
+    assert mongo_client.created == ["mongodb://uji"]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from bps_dataset import SharedDataset, RASIO_LP_COL
+from bps_schema import COLUMN_MAP
+
+COLUMNS = list(COLUMN_MAP.values())
+PENCARI_JML, LOWONGAN_JML = COLUMN_MAP["b1xjkdn0vw"], COLUMN_MAP["yeloqirlpp"]
+
+
+def _rows(n=5):
+    return [{"Provinsi": f"PROVINSI {i}", **{col: float(i * 10 + 1) for col in COLUMNS}} for i in range(n)]
+
+
+def test_exact_integer_columns_downcast_and_fractional_columns_keep_float64():
+    rows = _rows()
+    rows[0][PENCARI_JML] = 123456.7
+    rows[1][LOWONGAN_JML] = 16777217.5
+    dataset = SharedDataset(rows)
+    frame = dataset.frame
+    assert frame[PENCARI_JML].dtype == np.float64 and frame[PENCARI_JML].iloc[0] == 123456.7
+    assert frame[LOWONGAN_JML].dtype == np.float64 and frame[LOWONGAN_JML].iloc[1] == 16777217.5
+    assert frame[COLUMN_MAP["iihviv2ocw"]].dtype == np.int32
+    assert str(frame["Provinsi"].dtype) == "category"
+
+
+def test_shared_frame_cannot_be_modified_from_a_session():
+    dataset = SharedDataset(_rows())
+    session_frame = dataset.frame
+    session_frame["Kolom Baru"] = 1
+    session_frame[PENCARI_JML] = 0
+    assert "Kolom Baru" not in dataset.frame.columns
+    assert dataset.frame[PENCARI_JML].iloc[1] == 11
+    session_frame = dataset.frame
+    session_frame.loc[1, LOWONGAN_JML] = 777 # tulis in-place di salinan sesi
+    assert dataset.frame[LOWONGAN_JML].iloc[1] == 11
+
+
+def test_shared_buffers_are_not_writeable():
+    dataset = SharedDataset(_rows())
+    with pytest.raises(ValueError):
+        dataset._frame.iloc[0, 2] = 999
+
+
+def test_ratios_and_gender_long_are_shared_copies():
+    dataset = SharedDataset(_rows())
+    assert dataset.frame[RASIO_LP_COL].tolist() == [1.0] * 5
+    order, melted = dataset.gender_top_long(COLUMN_MAP["iihviv2ocw"], COLUMN_MAP["ijuxru3lvl"], PENCARI_JML, "Jumlah", top_n=3)
+    assert order == ["PROVINSI 4", "PROVINSI 3", "PROVINSI 2"] and len(melted) == 6
+    melted["x"] = 1
+    assert "x" not in dataset.gender_top_long(COLUMN_MAP["iihviv2ocw"], COLUMN_MAP["ijuxru3lvl"], PENCARI_JML, "Jumlah", top_n=3)[1].columns
@@ -0,0 +1,121 @@
+import copy
+import random
+from datetime import datetime, timezone
+
+import mongomock
+import pytest
+
+import bps_history
+from bps_history import ORDER_CELL, compute_content_hash, item_keys, list_history_versions, rebuild_snapshot, store_history_version
+
+ID_TABEL, TAHUN = "TABEL_UJI", "2024"
+
+
+@pytest.fixture
+def history_collection():
+    return mongomock.MongoClient()["bps_db"]["data_bps_uji_history"]
+
+
+def _store(history_collection, data_provinsi, metadata=None):
+    return store_history_version(history_collection, data_provinsi, metadata or {"judul_tabel": "Uji"},
+                                 ID_TABEL, TAHUN, TAHUN, datetime.now(timezone.utc))
+
+
+def _random_snapshot(rng, n_provinsi=6):
+    return [{"label": f"PROVINSI {i}", "kode": f"{i:02d}",
+             "variables": {f"v{j}": {"value_raw": str(rng.randint(0, 10_000))} for j in range(4)}}
+            for i in range(n_provinsi)]
+
+
+def test_round_trip_every_version_across_checkpoints(history_collection, monkeypatch):
+    monkeypatch.setattr(bps_history, "HISTORY_CHECKPOINT_INTERVAL", 3)
+    rng = random.Random(42)
+    data = _random_snapshot(rng)
+    stored = []
+    for step in range(10):
+        data = copy.deepcopy(data)
+        data[rng.randrange(len(data))]["variables"]["v1"] = {"value_raw": str(rng.randint(0, 10_000))}
+        if step == 4:
+            del data[2] # provinsi hilang
+        if step == 6:
+            data.append({"label": "PROVINSI BARU", "variables": {"v0": {"value_raw": "7"}}})
+        if step == 7:
+            data[0]["variables"].pop("v3") # variabel hilang
+        versi = _store(history_collection, data)
+        assert versi is not None
+        stored.append((versi, compute_content_hash(data), data))
+
+    checkpoints = [doc["versi"] for doc in history_collection.find({"is_checkpoint": True})]
+    assert checkpoints == [1, 4, 7, 10]
+    for versi, content_hash, data in stored:
+        snapshot = rebuild_snapshot(history_collection, ID_TABEL, TAHUN, versi)
+        assert snapshot["content_hash"] == content_hash
+        assert compute_content_hash(snapshot["data_provinsi"]) == content_hash
+        assert snapshot["data_provinsi"] == data
+    assert rebuild_snapshot(history_collection, ID_TABEL, TAHUN)["versi"] == stored[-1][0]
+
+
+def test_only_changed_cells_are_stored(history_collection):
+    data = _random_snapshot(random.Random(1))
+    _store(history_collection, data)
+    data = copy.deepcopy(data)
+    data[3]["variables"]["v2"] = {"value_raw": "123"}
+    _store(history_collection, data)
+    version_doc = history_collection.find_one({"versi": 2})
+    assert version_doc["cells_changed"] == [{"item": item_keys(data)[3], "id_var": "v2", "value": {"value_raw": "123"}}]
+    assert version_doc["cells_removed"] == []
+    assert "metadata_tabel_scraped" not in version_doc
+
+
+def test_inserting_or_removing_a_province_only_touches_its_cells(history_collection):
+    data = _random_snapshot(random.Random(4), n_provinsi=35)
+    _store(history_collection, data)
+    removed_key = item_keys(data)[0]
+    data = data[1:]
+    _store(history_collection, data)
+    version_doc = history_collection.find_one({"versi": 2})
+    assert [(cell["item"], cell["id_var"]) for cell in version_doc["cells_changed"]] == [ORDER_CELL]
+    assert {cell["item"] for cell in version_doc["cells_removed"]} == {removed_key}
+    assert len(version_doc["cells_removed"]) == 5 # sel meta + 4 variabel
+
+    data = [{"label": "PROVINSI BARU", "variables": {"v0": {"value_raw": "1"}}}] + data
+    _store(history_collection, data)
+    version_doc = history_collection.find_one({"versi": 3})
+    assert {cell["item"] for cell in version_doc["cells_changed"]} == {ORDER_CELL[0], item_keys(data)[0]}
+    assert version_doc["cells_removed"] == []
+    assert rebuild_snapshot(history_collection, ID_TABEL, TAHUN, 3)["data_provinsi"] == data
+
+
+def test_identical_content_adds_no_version(history_collection):
+    data = _random_snapshot(random.Random(2))
+    assert _store(history_collection, data) == 1
+    assert _store(history_collection, copy.deepcopy(data)) is None
+    assert [v["versi"] for v in list_history_versions(history_collection, ID_TABEL, TAHUN)] == [1]
+    assert _store(history_collection, data, {"judul_tabel": "Judul revisi"}) == 2
+
+
+def test_duplicate_and_missing_labels_do_not_collide(history_collection):
+    data = [
+        {"label": "X", "variables": {"a": 1}},
+        {"label": "X", "variables": {"a": 2}},
+        {"variables": {"a": 3}},
+        {"label": None, "variables": {"a": 4}},
+        {"label": "Y", "variables": None},
+        {"label": "Z", "variables": []},
+        {"label": "W", "variables": "x"},
+        {"label": "V", "variables": {}},
+        {"label": "U"},
+    ]
+    _store(history_collection, data)
+    changed = copy.deepcopy(data)
+    changed[1]["variables"]["a"] = 5
+    _store(history_collection, changed)
+    assert rebuild_snapshot(history_collection, ID_TABEL, TAHUN, 1)["data_provinsi"] == data
+    assert rebuild_snapshot(history_collection, ID_TABEL, TAHUN, 2)["data_provinsi"] == changed
+
+
+def test_rebuild_returns_none_on_hash_mismatch_or_unknown_version(history_collection):
+    _store(history_collection, _random_snapshot(random.Random(3)))
+    assert rebuild_snapshot(history_collection, ID_TABEL, TAHUN, 99) is None
+    history_collection.update_one({"versi": 1}, {"$set": {"cells_changed.0.value": "rusak"}})
+    assert rebuild_snapshot(history_collection, ID_TABEL, TAHUN, 1) is None
@@ -0,0 +1,81 @@
+import threading
+
+import mongomock
+import pytest
+
+import bps_loader
+from bps_loader import BackgroundLoader
+
+ID_TABEL, TAHUN = "TABEL_UJI", "2024"
+GEOJSON = {"type": "FeatureCollection", "features": []}
+
+
+class RecordingStop:
+    """Pengganti Event stop: mencatat jeda tiap putaran _run dan berhenti setelah `rounds` putaran."""
+
+    def __init__(self, rounds):
+        self.rounds = rounds
+        self.delays = []
+
+    def is_set(self):
+        return len(self.delays) >= self.rounds
+
+    def wait(self, delay):
+        self.delays.append(delay)
+
+    def set(self):
+        self.rounds = 0
+
+
+@pytest.fixture
+def collection_and_loader():
+    client = mongomock.MongoClient()
+    collection = client["bps_db"]["data_bps_uji"]
+    collection.insert_one({"bps_id_tabel": ID_TABEL, "bps_tahun_data_request": TAHUN, "versi_data": 1})
+    loader = BackgroundLoader("mongodb://uji", "bps_db", "data_bps_uji", ID_TABEL, TAHUN, geojson_url="http://uji/geo.json", client=client)
+    yield collection, loader
+    loader.stop()
+
+
+def test_ready_after_first_document_load_without_waiting_for_geojson(collection_and_loader, monkeypatch):
+    _, loader = collection_and_loader
+    release_geojson = threading.Event()
+    monkeypatch.setattr(bps_loader, "fetch_geojson", lambda url: release_geojson.wait(5) and GEOJSON)
+    assert not loader.wait_until_ready(timeout=0)
+    loader.start()
+    assert loader.wait_until_ready(timeout=5)
+    state = loader.snapshot()
+    assert state["ready"] and state["latest_doc"]["versi_data"] == 1
+    assert state["geojson"] is None # GeoJSON masih dimuat, tidak menahan ready
+    release_geojson.set()
+
+
+def test_failed_refresh_keeps_last_good_values_and_clears_error_on_recovery(collection_and_loader, monkeypatch):
+    collection, loader = collection_and_loader
+    monkeypatch.setattr(bps_loader, "fetch_geojson", lambda url: GEOJSON)
+    assert loader._load_document() and loader._load_geojson()
+
+    def failing(*args):
+        raise ConnectionError("jaringan putus")
+    monkeypatch.setattr(bps_loader, "fetch_latest_document", failing)
+    monkeypatch.setattr(bps_loader, "fetch_geojson", failing)
+    collection.update_one({}, {"$set": {"versi_data": 2}})
+    assert not loader._load_document() and not loader._load_geojson()
+    state = loader.snapshot()
+    assert state["latest_doc"]["versi_data"] == 1 and state["geojson"] == GEOJSON # data lama (stale) tetap dilayani
+    assert set(state["errors"]) == {"mongo", "geojson"}
+
+    monkeypatch.undo()
+    monkeypatch.setattr(bps_loader, "fetch_geojson", lambda url: GEOJSON)
+    assert loader._load_document() and loader._load_geojson()
+    state = loader.snapshot()
+    assert state["latest_doc"]["versi_data"] == 2 and state["errors"] == {}
+
+
+def test_retry_backoff_doubles_and_is_capped_by_refresh_interval(collection_and_loader):
+    _, loader = collection_and_loader
+    results = iter([False, False, False, False, True, False])
+    loader._stop = RecordingStop(rounds=6)
+    loader._run(lambda: next(results), refresh_seconds=30, sets_ready=True)
+    assert loader._stop.delays == [5, 10, 20, 30, 30, 5]
+    assert loader.wait_until_ready(timeout=0) # gagal pun tetap menandai ready setelah percobaan pertama
@@ -0,0 +1,35 @@
+import mongomock
+
+import scraper
+from bps_schema import is_schema_report_current
+
+JSON_BPS = {"data": [
+    {"page": 1, "count": 2},
+    {"kolom": {"b1xjkdn0vw": {"nama_variabel": "Pencari Kerja Jumlah"}},
+     "data": [
+         {"label": None, "variables": {"b1xjkdn0vw": {"value_raw": "1.234"}}},
+         {"label": "ACEH", "variables": {"b1xjkdn0vw": {"value_raw": "56"}}},
+         {"label": "INDONESIA", "variables": {"b1xjkdn0vw": {"value_raw": "1.290"}}},
+     ]},
+]}
+
+
+def test_schema_stage_tolerates_non_string_labels():
+    collection = mongomock.MongoClient()["bps_db"]["data_bps_uji"]
+    assert scraper.process_and_store_data(collection, JSON_BPS, "url", "T", "2024")
+    doc = collection.find_one()
+    assert [row["Provinsi"] for row in doc["data_provinsi_typed"]] == ["Prov Unknown #0", "ACEH"]
+    assert doc["data_provinsi_typed"][0]["Pencari Kerja Terdaftar - Jumlah"] == 1234.0
+
+
+def test_schema_stage_failure_still_stores_raw_snapshot(monkeypatch):
+    def failing_schema(*args):
+        raise RuntimeError("gagal")
+    monkeypatch.setattr(scraper, "apply_schema", failing_schema)
+    collection = mongomock.MongoClient()["bps_db"]["data_bps_uji"]
+    assert scraper.process_and_store_data(collection, JSON_BPS, "url", "T", "2024")
+    doc = collection.find_one()
+    assert len(doc["data_provinsi"]) == 3
+    assert doc["data_provinsi_typed"] is None
+    assert doc["validasi_skema"]["valid"] is False and "gagal" in doc["validasi_skema"]["error"]
+    assert not is_schema_report_current(doc["validasi_skema"]) # dashboard akan memvalidasi ulang dari data mentah